@@ -1,3 +1,4 @@
+import os
 import sys
 import math
 import numpy as np
@@ -5,84 +6,185 @@ from OpenGL.GLUT import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
 from pyrr.matrix44 import *
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common")) # Módulos compartilhados (instrument, lineraster)
+from bvh import BVH
+from renderer import (BatchRenderer, DamageRegion, SceneCanvas, rect_vertices, circle_vertices,
+                      RECT_FILL, RECT_LINE, CIRCLE_FILL, CIRCLE_LINE)
+from shapestore import (ShapeStore, RECT, CIRCLE, affine_from_matrix44, matrix44_from_affine, translated, around,
+                        rotation, axis_scale)
+from scenefile import load_scene, save_scene
+from sceneraster import Framebuffer
+import instrument
 
-shapes = []
+store = ShapeStore() # Dados de todas as formas, em arrays contíguos
+scene_path = "scene.shp" # Arquivo usado para salvar ('s') e carregar ('l'); o main usa o da linha de comando, se houver
+index = BVH() # Caixas envolventes das formas transformadas, para a seleção por clique
+
+# Preenchimentos e depois contornos, cada grupo em uma única chamada de desenho
+renderer = BatchRenderer([(GL_TRIANGLES, RECT_FILL), (GL_TRIANGLES, CIRCLE_FILL), (GL_LINES, RECT_LINE), (GL_LINES, CIRCLE_LINE)])
+
+# A cena fica guardada em um FBO; cada mudança marca a área afetada e só ela é redesenhada
+damage = DamageRegion()
+canvas = SceneCanvas()
+width, height = 800, 600
 
 # Definindo Retangulo
+# As formas são apenas referências para uma linha do store; os dados ficam nos arrays do ShapeStore
 class Rect(object):
+    __slots__ = ('i',)
+
     def __init__ (self, points, m = create_identity()):
-        self.points = points # points[0] = vertice superior à esquerda; points[1] = vertice inferior à direita
+        # points[0] = vertice superior à esquerda; points[1] = vertice inferior à direita
+        self.i = store.add(RECT, [*points[0], *points[1]])
         self.set_matrix(m) # Inicializa a matriz de transformações
 
+    @property
+    def points(self):
+        return store.geom[self.i].reshape(2, 2)
+
+    @property
+    def m(self): # Matriz 4x4 do pyrr equivalente à transformação guardada
+        return matrix44_from_affine(store.xform[self.i])
+
+    @property
+    def invm(self): # Inversa calculada sob demanda
+        return matrix44_from_affine(store.inverse(self.i))
+
     def set_point (self, i, p):
-        self.points[i] = p
+        store.geom[self.i, 2 * i:2 * i + 2] = p
+        self.refit()
         
     def get_center(self): # Retorna o centro da forma transformada
-        center = [(self.points[0][0] + self.points[1][0])/2, 
-                        (self.points[1][1] + self.points[0][1])/2]
-        trans_center = apply_to_vector(self.m, [center[0],center[1],0,1])
-        return trans_center
+        return store.center(self.i)
+
+    def set_matrix(self,t): # Aplicar transformação (a inversa só é calculada no próximo teste de ponto)
+        self.set_transform(affine_from_matrix44(t))
+
+    def set_transform(self, a): # Aplicar transformação afim 2D (3x2)
+        store.set_transform(self.i, a)
+        self.refit()
 
-    def set_matrix(self,t): # Aplicar transformação 
-        self.m = t
-        self.invm = inverse(t)
+    def bounds(self): # Caixa [xmin, ymin, xmax, ymax] da forma transformada
+        return store.bounds([self.i])[0]
+
+    def refit(self): # Atualiza a caixa da forma no índice de seleção e marca a cena para ser reenviada à GPU
+        if self.i < index.count:
+            box = self.bounds()
+            damage.add(index.boxes[self.i]) # A área onde a forma estava e a área onde ela ficou precisam ser redesenhadas
+            damage.add(box)
+            index.update(self.i, box)
+            renderer.invalidate()
 
     def contains(self,p): # Verifica se o ponto está contido na forma
-        p = apply_to_vector(self.invm, [p[0],p[1],0,1]) # Desfaz a transformação para verificar o contain
-        xmin = min(self.points[0][0],self.points[1][0])
-        xmax = max(self.points[0][0],self.points[1][0])
-        ymin = min(self.points[0][1],self.points[1][1])
-        ymax = max(self.points[0][1],self.points[1][1])
-        return xmin <= p[0] <= xmax and ymin <=p[1] <= ymax
-    
-    def draw (self):
-        glPushMatrix()
-        glMultMatrixf(self.m)
-        glRectf(*self.points[0],*self.points[1])
-        glPopMatrix()
+        return store.contains_point(self.i, p[0], p[1])
 
 #Definindo Circulo
 class Circle(object):
+    __slots__ = ('i',)
+
     def __init__(self, center, radius, m=create_identity()):
-        self.center = center
-        self.radius = radius
+        self.i = store.add(CIRCLE, [center[0], center[1], radius, 0])
         self.set_matrix(m) # Inicializa a matriz de transformações
 
+    @property
+    def center(self):
+        return store.geom[self.i, :2]
+
+    @property
+    def radius(self):
+        return store.geom[self.i, 2]
+
+    @property
+    def m(self): # Matriz 4x4 do pyrr equivalente à transformação guardada
+        return matrix44_from_affine(store.xform[self.i])
+
+    @property
+    def invm(self): # Inversa calculada sob demanda
+        return matrix44_from_affine(store.inverse(self.i))
+
     def get_center(self): # Retorna o centro da forma transformada
-        trans_center = apply_to_vector(self.m, [self.center[0],self.center[1],0,1])
-        return trans_center
+        return store.center(self.i)
 
     def set_radius(self, radius):
-        self.radius = radius
+        store.geom[self.i, 2] = radius
+        self.refit()
+
+    def set_matrix(self, t): # Aplicar transformação (a inversa só é calculada no próximo teste de ponto)
+        self.set_transform(affine_from_matrix44(t))
 
-    def set_matrix(self, t): # Aplicar transformação 
-        self.m = t
-        self.invm = inverse(t)
+    def set_transform(self, a): # Aplicar transformação afim 2D (3x2)
+        store.set_transform(self.i, a)
+        self.refit()
+
+    def bounds(self): # Caixa [xmin, ymin, xmax, ymax] da elipse resultante da transformação
+        return store.bounds([self.i])[0]
+
+    def refit(self): # Atualiza a caixa da forma no índice de seleção e marca a cena para ser reenviada à GPU
+        if self.i < index.count:
+            box = self.bounds()
+            damage.add(index.boxes[self.i]) # A área onde a forma estava e a área onde ela ficou precisam ser redesenhadas
+            damage.add(box)
+            index.update(self.i, box)
+            renderer.invalidate()
 
     def contains(self, p): # Verifica se o ponto está contido na forma
-        p = apply_to_vector(self.invm, [p[0], p[1], 0, 1]) # Desfaz a transformação para verificar o contain
-        dx = p[0] - self.center[0]
-        dy = p[1] - self.center[1]
-        return dx * dx + dy * dy <= self.radius * self.radius
-
-    def draw(self): # Desenha o círculo como um polígono
-        glPushMatrix()
-        glMultMatrixf(self.m)
-        glBegin(GL_POLYGON)
-        vertices = np.linspace(0,360,1000) # Usando 1000 - 1 vertices
-        for i in vertices:
-            angle = 2 * math.pi * i / 360
-            x = self.center[0] + self.radius * math.cos(angle)
-            y = self.center[1] + self.radius * math.sin(angle)
-            glVertex2f(x, y)
-        glEnd()
-        glPopMatrix()
+        return store.contains_point(self.i, p[0], p[1])
+
+# Referências (Rect/Circle) para as linhas do store, na ordem de desenho, criadas só quando alguém pede uma forma
+# Assim uma cena carregada de arquivo não precisa de um objeto por forma
+class ShapeList(object):
+    def __len__(self):
+        return store.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += store.count
+        if not 0 <= i < store.count:
+            raise IndexError(i)
+        cls = Rect if store.kind[i] == RECT else Circle
+        s = cls.__new__(cls) # A forma já existe no store, então não passa pelo __init__
+        s.i = int(i)
+        return s
+
+shapes = ShapeList()
+
+def add_shape(s): # Adiciona a forma à cena e ao índice de seleção (a posição no índice é a mesma do store)
+    box = s.bounds()
+    index.insert(box)
+    damage.add(box)
+    renderer.invalidate()
+
+def pick(x, y): # Retorna a forma desenhada por cima no ponto (x, y), ou None
+    # O índice devolve só as formas cuja caixa contém o ponto; o teste exato é feito em lote sobre o store
+    # e, entre as que contêm o ponto, a última desenhada tem prioridade
+    candidates = np.array(index.query(x, y), dtype=np.int64)
+    hits = candidates[store.contains(candidates, x, y)]
+    return shapes[hits.max()] if len(hits) else None
+
+def scene_vertices(idx=None): # Vértices transformados de cada grupo do renderer (de todas as formas ou só das de idx)
+    # Formas mais recentes ficam por cima: cada forma ganha uma profundidade para o preenchimento e outra,
+    # logo acima, para o contorno. A profundidade depende só da posição da forma, então um subconjunto
+    # desenhado por cima da cena guardada mantém a mesma ordem de sobreposição
+    n = store.count
+    idx = store.all() if idx is None else np.asarray(idx, dtype=np.int64)
+    depth = (np.stack([2 * idx, 2 * idx + 1], axis=1) + 1) / (2 * n + 2)
+    kind, geom, xform = store.kind[idx], store.geom[idx], store.xform[idx]
+    rects, circles = np.nonzero(kind == RECT)[0], np.nonzero(kind == CIRCLE)[0]
+    rect_fill, rect_line = rect_vertices(geom[rects].reshape(-1, 2, 2), xform[rects, :2], xform[rects, 2],
+                                         depth[rects, 0], depth[rects, 1])
+    circle_fill, circle_line = circle_vertices(geom[circles, :2], geom[circles, 2], xform[circles, :2], xform[circles, 2],
+                                               depth[circles, 0], depth[circles, 1])
+    return rect_fill, circle_fill, rect_line, circle_line
 
 picked = None
+start_transform = None # Transformação da forma selecionada no início do arraste
 modeConstants = ["CREATE RECT", "CREATE CIRCLE", "TRANSLATE", "ROTATE", "SCALE"]
 mode = modeConstants[0]
 
-def reshape( width, height):
+def reshape(w, h):
+    global width, height
+    width, height = w, h
+    damage.invalidate()
     glViewport(0,0,width,height)
     glMatrixMode(GL_PROJECTION)
     glLoadIdentity()
@@ -90,34 +192,22 @@ def reshape( width, height):
     glMatrixMode (GL_MODELVIEW)
 
 def mouse (button, state, x, y): # Ação após primeiro clique
-    global lastx,lasty,picked,firstx,firsty
+    global picked,firstx,firsty,center,start_transform
     if state!=GLUT_DOWN: return
     if mode == "CREATE RECT":
-        shapes.append(Rect([[x,y],[x,y]]))
+        add_shape(Rect([[x,y],[x,y]]))
     elif mode == "CREATE CIRCLE":
-        shapes.append(Circle([x, y], 0))
-    elif mode == "TRANSLATE":
-        picked = None
-        for s in shapes:
-            if s.contains([x,y]): 
-                picked = s
-        lastx,lasty = x,y 
-    elif mode == "ROTATE":
-        picked = None
-        for s in shapes:
-            if s.contains([x,y]): 
-                picked = s
-        lastx,lasty = x,y 
-    elif mode == "SCALE":
-        picked = None
-        for s in shapes:
-            if s.contains([x, y]):
-                picked = s
-        lastx,lasty = x,y
+        add_shape(Circle([x, y], 0))
+    else:
+        # Cada evento do arraste é aplicado sobre a transformação do início do arraste, e não sobre a do evento
+        # anterior, então o erro numérico não cresce com a quantidade de eventos
+        picked = pick(x, y)
         firstx,firsty = x,y
+        if picked:
+            center = picked.get_center() # Rotação e escala em torno do centro não o movem
+            start_transform = store.xform[picked.i].copy()
 
 def mouse_drag(x, y): # Ação durante arrastar do mouse
-    global lastx,lasty,firstx,firsty
     if mode == "CREATE RECT":
         shapes[-1].set_point(1,[x,y])
     elif mode == "CREATE CIRCLE":
@@ -127,78 +217,79 @@ def mouse_drag(x, y): # Ação durante arrastar do mouse
         shapes[-1].set_radius(radius)
     elif mode == "TRANSLATE":
         if picked:
-            t = create_from_translation([x-lastx, y-lasty, 0])
-            picked.set_matrix(multiply(picked.m,t))
-            lastx, lasty = x, y
+            picked.set_transform(translated(start_transform, x - firstx, y - firsty))
     elif mode == "ROTATE":
         if picked:
-            center = picked.get_center()
-
-            # Vetores entre o ponto clicado e o centro da forma
-            last_vector = [lastx - center[0], lasty - center[1]]
-            current_vector = [x - center[0], y - center[1]]
-
-            angle = (math.atan2(current_vector[1], current_vector[0]) 
-                     - math.atan2(last_vector[1], last_vector[0]))
-
-            # Traz a forma para o centro do eixo, rotaciona e a leva de volta
-            t = create_from_translation([-center[0], -center[1], 0])
-            rotation_matrix = create_from_eulers([0, -angle, 0])
-            rt = create_from_translation([center[0], center[1], 0])
-            transform_matrix = t @ rotation_matrix @ rt
+            # Ângulo entre os vetores do centro da forma até o primeiro clique e até o ponto atual
+            angle = (math.atan2(y - center[1], x - center[0])
+                     - math.atan2(firsty - center[1], firstx - center[0]))
 
-            picked.set_matrix(picked.m @ transform_matrix) # Aplica transformação
-            lastx, lasty = x, y
+            picked.set_transform(around(start_transform, rotation(angle), *center)) # Rotaciona em torno do centro
     elif mode == "SCALE":
         if picked:
-            center = picked.get_center()
             if center[0] != firstx or center[1] != firsty:
-                scale_axis = [firstx - center[0], firsty - center[1]] # Eixo de escala definido pelo primeiro clique
-                scale_axis_unit = scale_axis/np.linalg.norm(scale_axis) # Direção de escala
-                angle_to_x = -math.atan2(scale_axis[1], scale_axis[0]) # Angulo entre o eixo de escalonamento e o eixo X, padrão antihorario
-
-                # Vetores do centro da forma até os pontos de clique atual e anterior do mouse
-                mouse_axis = [x - center[0], y - center[1]]
-                last_mouse_axis = [lastx - center[0], lasty - center[1]]
-
-                # Projeção dos vetores do mouse sobre o eixo de escala
-                proj = np.dot(mouse_axis, scale_axis) / np.linalg.norm(scale_axis)
-                last_proj = np.dot(last_mouse_axis, scale_axis) / np.linalg.norm(scale_axis)
-
-                scale_factor = proj/last_proj
-
-                # Traz a forma para o centro do eixo, alinha o eixo de escala com o eixo X, escalona e retorna
-                t = create_from_translation([-center[0], -center[1], 0])
-                rot = create_from_eulers([0, -angle_to_x, 0])
-                scale_matrix = create_from_scale([scale_factor, 1, 1])
-                rrot = create_from_eulers([0, angle_to_x, 0])
-                rt = create_from_translation([center[0], center[1], 0])
-                transform_matrix = t @ rot @ scale_matrix @ rrot @ rt
-
-                picked.set_matrix(picked.m @ transform_matrix) # Aplica transformação
-                lastx, lasty = x, y
+                # Eixo de escala definido pelo primeiro clique
+                ax, ay = firstx - center[0], firsty - center[1]
+                norm = math.hypot(ax, ay)
+                ux, uy = ax / norm, ay / norm # Direção de escala
+
+                # Projeção do vetor do centro até o mouse sobre o eixo, relativa à do primeiro clique (que é norm)
+                scale_factor = ((x - center[0]) * ux + (y - center[1]) * uy) / norm
+
+                picked.set_transform(around(start_transform, axis_scale(ux, uy, scale_factor), *center)) # Escalona em torno do centro
        
     glutPostRedisplay()
 
+def save(path): # Grava a cena direto dos arrays do store
+    save_scene(path, store)
+
+def load(path): # Mapeia a cena do arquivo na memória e reconstrói o índice de seleção
+    global picked
+    store.assign(*load_scene(path))
+    index.build(store.bounds(store.all()))
+    picked = None
+    renderer.invalidate()
+    damage.invalidate()
+
+def keyboard(key, x, y):
+    if key == b's':
+        save(scene_path)
+    elif key == b'l' and os.path.exists(scene_path):
+        load(scene_path)
+    glutPostRedisplay()
+
 def display():
-    glClear(GL_COLOR_BUFFER_BIT)
-    for s in shapes:
-        if isinstance(s, Circle):
-            glColor3f(1, 0.6, 0.8)
-            glPolygonMode(GL_FRONT_AND_BACK,GL_FILL)
-            s.draw()
-            glColor3f(0.8, 0, 0.4)
-            glPolygonMode(GL_FRONT_AND_BACK,GL_LINE)
-            s.draw()
-        else:
-            glColor3f(0.8, 0.6, 1)
-            glPolygonMode(GL_FRONT_AND_BACK,GL_FILL)
-            s.draw()
-            glColor3f(0.5, 0, 0.5)
-            glPolygonMode(GL_FRONT_AND_BACK,GL_LINE)
-            s.draw()
+    region = damage.take(width, height)
+    if canvas.resize(width, height):
+        region = True
+    canvas.bind()
+    glEnable(GL_DEPTH_TEST)
+    if region is True: # Cena inteira, com os buffers do renderer
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        if renderer.dirty: # Só recalcula os vértices quando alguma forma mudou
+            renderer.upload(scene_vertices())
+        renderer.draw()
+    elif region is not None: # Só a área alterada: limpa com o scissor e redesenha as formas que a cruzam
+        x0, y0, x1, y1 = region
+        glEnable(GL_SCISSOR_TEST)
+        glScissor(x0, height - y1, x1 - x0, y1 - y0) # O scissor conta y de baixo para cima
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        renderer.draw_arrays(scene_vertices(index.query_box(region)))
+        glDisable(GL_SCISSOR_TEST)
+    canvas.present()
     glutSwapBuffers()
 
+def render_offscreen(path=None): # Desenha a cena sem janela, com os mesmos vértices e a mesma ordem do display
+    fb = Framebuffer(width, height)
+    rect_fill, circle_fill, rect_line, circle_line = scene_vertices()
+    fb.triangles(rect_fill, RECT_FILL)
+    fb.triangles(circle_fill, CIRCLE_FILL)
+    fb.lines(rect_line, RECT_LINE)
+    fb.lines(circle_line, CIRCLE_LINE)
+    if path is not None:
+        fb.save(path)
+    return fb
+
 def createMenu():
     def domenu(item):
         global mode
@@ -209,13 +300,26 @@ def createMenu():
         glutAddMenuEntry(name, i)
     glutAttachMenu(GLUT_RIGHT_BUTTON)
 
-glutInit(sys.argv)
-glutInitDisplayMode (GLUT_DOUBLE | GLUT_RGB)
-glutInitWindowSize (800, 600)
-glutCreateWindow ("Shape Editor")
-glutMouseFunc(mouse)
-glutMotionFunc(mouse_drag)
-glutDisplayFunc(display)
-glutReshapeFunc(reshape)
-createMenu()
-glutMainLoop()
+# Medição opcional dos callbacks e das chamadas OpenGL (ligada com PERF_TRACE=arquivo.json)
+instrument.install(globals(), ["display", "pick", "mouse", "mouse_drag", "scene_vertices"], frame="display",
+                   gl_namespaces=[globals(), vars(sys.modules[BatchRenderer.__module__])])
+
+def main():
+    global scene_path
+    if len(sys.argv) > 1:
+        scene_path = sys.argv[1]
+    glutInit(sys.argv)
+    glutSetOption(GLUT_ACTION_ON_WINDOW_CLOSE, GLUT_ACTION_GLUTMAINLOOP_RETURNS) # Fechar a janela volta do glutMainLoop, e o instrument grava o trace ao sair
+    glutInitDisplayMode (GLUT_DOUBLE | GLUT_RGB | GLUT_DEPTH)
+    glutInitWindowSize (width, height)
+    glutCreateWindow ("Shape Editor")
+    glutMouseFunc(mouse)
+    glutMotionFunc(mouse_drag)
+    glutKeyboardFunc(keyboard)
+    glutDisplayFunc(display)
+    glutReshapeFunc(reshape)
+    createMenu()
+    glutMainLoop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import numpy as np
+
+# Hierarquia de volumes envolventes (BVH) sobre caixas alinhadas aos eixos [xmin, ymin, xmax, ymax]
+# Cada item é identificado pelo índice em que foi inserido. A consulta por ponto visita só os nós
+# cujas caixas contêm o ponto, então descobrir quais itens podem conter um clique custa O(log N)
+class BVH(object):
+    leaf_size = 4 # Quantidade máxima de itens por folha
+
+    def __init__(self):
+        self.boxes = np.zeros((16, 4)) # Caixa de cada item (com folga para inserções)
+        self.count = 0
+        self.built = 0 # Itens com índice a partir daqui foram inseridos depois da última construção e são testados um a um
+        self.root = None
+
+    def insert(self, box): # Insere um item e retorna seu índice
+        if self.count == len(self.boxes):
+            self.boxes = np.concatenate([self.boxes, np.zeros((max(len(self.boxes), 16), 4))])
+        i = self.count
+        self.boxes[i] = box
+        self.count += 1
+        return i
+
+    def build(self, boxes=None): # Reconstrói a árvore inteira (opcionalmente a partir de um array de caixas)
+        # Construção de baixo para cima, sem recursão: os itens são ordenados pela curva de Morton (ordem Z) dos
+        # centros, agrupados de leaf_size em leaf_size nas folhas, e cada nível junta os nós vizinhos dois a dois.
+        # Tudo em operações NumPy por nível, então construir sobre um milhão de caixas leva uma fração de segundo
+        if boxes is not None:
+            self.boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+            self.count = len(self.boxes)
+        self.built = n = self.count
+        if n == 0:
+            self.order = self.start = self.size = self.leaf_of = self.left = self.right = self.parent = np.zeros(0, dtype=np.int64)
+            self.node_boxes = np.zeros((0, 4))
+            self.root = None
+            return
+        boxes = self.boxes[:n]
+        self.order = np.argsort(self.morton((boxes[:, :2] + boxes[:, 2:]) / 2), kind='stable')
+        # Folhas: a folha k tem os itens order[start[k]:start[k] + size[k]]
+        self.start = np.arange(0, n, self.leaf_size)
+        self.size = np.minimum(self.leaf_size, n - self.start)
+        self.leaf_of = np.empty(n, dtype=np.int64)
+        self.leaf_of[self.order] = np.arange(n) // self.leaf_size
+        sorted_boxes = boxes[self.order]
+        node_boxes = [np.concatenate([np.minimum.reduceat(sorted_boxes[:, :2], self.start),
+                                      np.maximum.reduceat(sorted_boxes[:, 2:], self.start)], axis=1)]
+        left, right = [np.full(len(self.start), -1)], [np.full(len(self.start), -1)] # -1 nas folhas
+        level = np.arange(len(self.start)) # Nós do nível atual
+        total = len(level)
+        while len(level) > 1:
+            pairs = len(level) // 2
+            a, b = level[0:2 * pairs:2], level[1:2 * pairs:2]
+            boxes_now = np.concatenate(node_boxes)
+            node_boxes.append(np.concatenate([np.minimum(boxes_now[a, :2], boxes_now[b, :2]),
+                                              np.maximum(boxes_now[a, 2:], boxes_now[b, 2:])], axis=1))
+            left.append(a)
+            right.append(b)
+            parents = np.arange(total, total + pairs)
+            total += pairs
+            level = np.concatenate([parents, level[2 * pairs:]]) # Um nó sem par sobe para o próximo nível
+        self.node_boxes = np.concatenate(node_boxes)
+        self.left, self.right = np.concatenate(left), np.concatenate(right)
+        self.parent = np.full(total, -1)
+        internal = self.left >= 0
+        self.parent[self.left[internal]] = np.nonzero(internal)[0]
+        self.parent[self.right[internal]] = np.nonzero(internal)[0]
+        self.root = int(level[0])
+
+    @staticmethod
+    def morton(points): # Código de Morton (bits de x e y intercalados) dos pontos, com 16 bits por eixo
+        points = np.nan_to_num(points, nan=0.0, posinf=0.0, neginf=0.0) # Caixas infinitas só perdem a posição na ordem
+        lo, hi = points.min(axis=0), points.max(axis=0)
+        q = ((points - lo) / np.maximum(hi - lo, 1e-12) * 65535).astype(np.uint32)
+        for shift, mask in ((8, 0x00FF00FF), (4, 0x0F0F0F0F), (2, 0x33333333), (1, 0x55555555)):
+            q = (q | (q << shift)) & mask
+        return q[:, 0] | (q[:, 1] << 1)
+
+    def update(self, i, box): # Atualiza a caixa do item i e reajusta só os nós acima dele
+        self.boxes[i] = box
+        if i >= self.built:
+            return
+        k = self.leaf_of[i]
+        items = self.order[self.start[k]:self.start[k] + self.size[k]]
+        b = self.boxes[items]
+        self.node_boxes[k] = b[:, 0].min(), b[:, 1].min(), b[:, 2].max(), b[:, 3].max()
+        k = self.parent[k]
+        while k >= 0:
+            left, right = self.left[k], self.right[k]
+            self.node_boxes[k, :2] = np.minimum(self.node_boxes[left, :2], self.node_boxes[right, :2])
+            self.node_boxes[k, 2:] = np.maximum(self.node_boxes[left, 2:], self.node_boxes[right, 2:])
+            k = self.parent[k]
+
+    def query(self, x, y): # Índices dos itens cujas caixas contêm o ponto (x, y)
+        return self.query_box((x, y, x, y))
+
+    def query_box(self, box): # Índices dos itens cujas caixas cruzam a caixa [xmin, ymin, xmax, ymax]
+        # Reconstrói quando as inserções pendentes passam a pesar na consulta (custo amortizado O(log N) por inserção)
+        if self.count - self.built > max(32, self.count // 8):
+            self.build()
+
+        hits = self.overlapping(np.arange(self.built, self.count), box)
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            k = stack.pop()
+            if not self.overlaps(self.node_boxes[k], box):
+                continue
+            if self.left[k] < 0:
+                hits.extend(self.overlapping(self.order[self.start[k]:self.start[k] + self.size[k]], box))
+            else:
+                stack.extend((self.left[k], self.right[k]))
+        return hits
+
+    def overlapping(self, items, box): # Itens de items cujas caixas cruzam box, testados de uma vez
+        b = self.boxes[items]
+        return items[(b[:, 0] <= box[2]) & (box[0] <= b[:, 2]) & (b[:, 1] <= box[3]) & (box[1] <= b[:, 3])].tolist()
+
+    @staticmethod
+    def overlaps(a, b):
+        return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
@@ -0,0 +1,33 @@
+import os
+import argparse
+from multiprocessing import Pool
+import ShapeEditor
+
+# Desenha cenas salvas pelo ShapeEditor em arquivos PNG, sem abrir janela
+# Cada cena é desenhada em um processo separado, então um lote usa todos os núcleos disponíveis
+
+def render(job): # Carrega uma cena e grava sua imagem; roda dentro de um processo do Pool
+    scene, output, width, height = job
+    ShapeEditor.width, ShapeEditor.height = width, height
+    ShapeEditor.load(scene)
+    ShapeEditor.render_offscreen(output)
+    return output
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Desenha cenas do ShapeEditor (.shp) em imagens PNG sem abrir janela")
+    parser.add_argument("scenes", nargs="+", help="arquivos de cena gravados com a tecla 's'")
+    parser.add_argument("--output", default=".", help="diretório onde as imagens são gravadas")
+    parser.add_argument("--size", default="800x600", help="largura x altura da imagem")
+    parser.add_argument("--jobs", type=int, default=None, help="quantidade de processos (padrão: um por núcleo)")
+    args = parser.parse_args(argv)
+
+    width, height = (int(v) for v in args.size.split("x"))
+    os.makedirs(args.output, exist_ok=True)
+    jobs = [(scene, os.path.join(args.output, os.path.splitext(os.path.basename(scene))[0] + ".png"), width, height)
+            for scene in args.scenes]
+    with Pool(min(args.jobs or os.cpu_count(), len(jobs))) as pool:
+        for output in pool.imap_unordered(render, jobs):
+            print(output)
+
+if __name__ == "__main__":
+    main()
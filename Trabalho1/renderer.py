@@ -0,0 +1,168 @@
+import math
+import numpy as np
+from OpenGL.GL import *
+
+# Desenho em lote das formas: em vez de uma sequência de chamadas OpenGL por forma, os vértices de
+# todas as formas de um mesmo tipo e passada (preenchimento ou contorno) são transformados com NumPy
+# e enviados em um único buffer, desenhado com uma única chamada
+
+# Cores de cada grupo, iguais às do desenho forma a forma
+RECT_FILL, RECT_LINE = (0.8, 0.6, 1), (0.5, 0, 0.5)
+CIRCLE_FILL, CIRCLE_LINE = (1, 0.6, 0.8), (0.8, 0, 0.4)
+
+unit_circles = {} # Vértices de círculos unitários já calculados, indexados pela quantidade de segmentos
+
+def unit_circle(segments): # Círculo unitário com a quantidade de segmentos pedida, calculado uma única vez
+    if segments not in unit_circles:
+        angles = np.arange(segments) * (2 * math.pi / segments)
+        unit_circles[segments] = np.column_stack([np.cos(angles), np.sin(angles)])
+    return unit_circles[segments]
+
+def circle_segments(screen_radius, tol=0.25): # Nível de detalhe: segmentos para o polígono ficar a menos de tol pixels do círculo
+    r = np.maximum(np.asarray(screen_radius, dtype=np.float64), tol)
+    segments = np.pi / np.arccos(1 - tol / r)
+    return np.clip(2 ** np.ceil(np.log2(segments)), 8, 1024).astype(np.int64) # Potência de 2 para reaproveitar as tabelas
+
+def screen_radii(radii, linear): # Maior raio na tela de cada círculo (maior valor singular da parte linear)
+    s = (linear ** 2).sum(axis=(1, 2))
+    det = linear[:, 0, 0] * linear[:, 1, 1] - linear[:, 0, 1] * linear[:, 1, 0]
+    return radii * np.sqrt((s + np.sqrt(np.maximum(s * s - 4 * det * det, 0))) / 2)
+
+def with_depth(vertices, depth): # Acrescenta a profundidade de cada forma como coordenada z de todos os seus vértices
+    z = np.broadcast_to(np.asarray(depth, dtype=np.float64)[:, None, None], vertices.shape[:2] + (1,))
+    return np.concatenate([vertices, z], axis=2).reshape(-1, 3).astype(np.float32)
+
+# Vértices dos retângulos já transformados: dois triângulos por retângulo para o preenchimento
+# e quatro segmentos para o contorno. points tem forma (N, 2, 2) com os dois cantos opostos
+def rect_vertices(points, linear, translation, fill_depth, line_depth):
+    (x0, y0), (x1, y1) = points[:, 0].T, points[:, 1].T
+    corners = np.stack([np.stack([x0, y0], 1), np.stack([x1, y0], 1), np.stack([x1, y1], 1), np.stack([x0, y1], 1)], 1)
+    corners = corners @ linear + translation[:, None]
+    fill = with_depth(corners[:, [0, 1, 2, 0, 2, 3]], fill_depth)
+    line = with_depth(corners[:, [0, 1, 1, 2, 2, 3, 3, 0]], line_depth)
+    return fill, line
+
+# Vértices dos círculos já transformados: um leque de triângulos para o preenchimento e um segmento
+# por lado para o contorno. Os círculos são agrupados pela quantidade de segmentos do nível de detalhe
+def circle_vertices(centers, radii, linear, translation, fill_depth, line_depth):
+    segments = circle_segments(screen_radii(radii, linear))
+    fills, lines = [], []
+    for k in np.unique(segments):
+        sel = segments == k
+        ring = centers[sel, None] + radii[sel, None, None] * unit_circle(int(k))
+        ring = ring @ linear[sel] + translation[sel, None]
+        center = centers[sel, None] @ linear[sel] + translation[sel, None]
+        nxt = np.roll(ring, -1, axis=1)
+        fans = np.stack([np.broadcast_to(center, ring.shape), ring, nxt], axis=2).reshape(len(ring), -1, 2)
+        fills.append(with_depth(fans, fill_depth[sel]))
+        lines.append(with_depth(np.stack([ring, nxt], axis=2).reshape(len(ring), -1, 2), line_depth[sel]))
+    empty = np.zeros((0, 3), dtype=np.float32)
+    return np.concatenate(fills + [empty]), np.concatenate(lines + [empty])
+
+# Um buffer de vértices (VBO) por grupo de desenho. Os grupos são desenhados na ordem dada, cada um com
+# sua primitiva e cor em uma única chamada. A ordem de sobreposição entre formas vem da coordenada z,
+# então o teste de profundidade precisa estar ativo
+class BatchRenderer(object):
+    def __init__(self, groups):
+        self.groups = groups # Lista de (primitiva, cor)
+        self.vbos = None
+        self.counts = [0] * len(groups)
+        self.dirty = True
+
+    def invalidate(self): # Marca os buffers para serem reenviados no próximo desenho
+        self.dirty = True
+
+    def upload(self, arrays): # Envia um array (n x 3) float32 por grupo
+        if self.vbos is None: # Só pode ser criado depois que existe um contexto OpenGL
+            self.vbos = [glGenBuffers(1) for _ in self.groups]
+        for i, data in enumerate(arrays):
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbos[i])
+            glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_DYNAMIC_DRAW)
+            self.counts[i] = len(data)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.dirty = False
+
+    def draw(self):
+        glEnableClientState(GL_VERTEX_ARRAY)
+        for (mode, color), vbo, count in zip(self.groups, self.vbos or [], self.counts):
+            if count:
+                glColor3f(*color)
+                glBindBuffer(GL_ARRAY_BUFFER, vbo)
+                glVertexPointer(3, GL_FLOAT, 0, None)
+                glDrawArrays(mode, 0, count)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+    def draw_arrays(self, arrays): # Desenha, direto da memória, um array (n x 3) float32 por grupo (sem usar os buffers)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        for (mode, color), data in zip(self.groups, arrays):
+            if len(data):
+                glColor3f(*color)
+                glVertexPointer(3, GL_FLOAT, 0, data)
+                glDrawArrays(mode, 0, len(data))
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+# Região da tela que precisa ser redesenhada: a união das caixas antigas e novas das formas que mudaram
+# desde o último quadro. full indica que a tela inteira precisa ser redesenhada
+class DamageRegion(object):
+    padding = 2 # Folga em pixels para a espessura das linhas
+
+    def __init__(self):
+        self.box = None
+        self.full = True
+
+    def add(self, box):
+        box = np.asarray(box, dtype=np.float64)
+        if not np.all(np.isfinite(box)):
+            self.full = True
+        elif self.box is None:
+            self.box = box.copy()
+        else:
+            self.box = np.concatenate([np.minimum(self.box[:2], box[:2]), np.maximum(self.box[2:], box[2:])])
+
+    def invalidate(self):
+        self.full = True
+
+    def take(self, width, height): # Retorna e limpa a região: True (tela inteira), (x0, y0, x1, y1) em pixels, ou None
+        region = True if self.full else self.box
+        self.box, self.full = None, False
+        if region is None or region is True:
+            return region
+        x0, y0 = np.floor(np.maximum(region[:2] - self.padding, 0)).astype(int)
+        x1, y1 = np.ceil(np.minimum(region[2:] + self.padding, [width, height])).astype(int)
+        return (x0, y0, x1, y1) if x0 < x1 and y0 < y1 else None
+
+# Cópia persistente da cena em um framebuffer (FBO) com cor e profundidade. Com buffer duplo o conteúdo do
+# back buffer não é preservado entre quadros, então a cena é desenhada aqui e copiada para a janela a cada quadro
+class SceneCanvas(object):
+    def __init__(self):
+        self.fbo = None
+        self.size = None
+
+    def resize(self, width, height): # Recria o FBO se o tamanho mudou; retorna True quando o conteúdo foi perdido
+        if self.size == (width, height):
+            return False
+        if self.fbo is not None:
+            glDeleteRenderbuffers(2, self.renderbuffers)
+            glDeleteFramebuffers(1, [self.fbo])
+        self.size = (width, height)
+        self.fbo = glGenFramebuffers(1)
+        self.renderbuffers = glGenRenderbuffers(2)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        for rb, fmt, attachment in zip(self.renderbuffers, (GL_RGBA8, GL_DEPTH_COMPONENT24), (GL_COLOR_ATTACHMENT0, GL_DEPTH_ATTACHMENT)):
+            glBindRenderbuffer(GL_RENDERBUFFER, rb)
+            glRenderbufferStorage(GL_RENDERBUFFER, fmt, width, height)
+            glFramebufferRenderbuffer(GL_FRAMEBUFFER, attachment, GL_RENDERBUFFER, rb)
+        glBindRenderbuffer(GL_RENDERBUFFER, 0)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        return True
+
+    def bind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+
+    def present(self): # Copia a cena para o back buffer da janela
+        width, height = self.size
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.fbo)
+        glBindFramebuffer(GL_DRAW_FRAMEBUFFER, 0)
+        glBlitFramebuffer(0, 0, width, height, 0, 0, width, height, GL_COLOR_BUFFER_BIT, GL_NEAREST)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
@@ -0,0 +1,94 @@
+import os
+import struct
+import tempfile
+import numpy as np
+
+# Formato binário da cena, com as mesmas colunas do ShapeStore gravadas uma depois da outra:
+#   cabeçalho  (32 bytes) assinatura, versão e quantidade de formas
+#   kind       uint8 por forma (seção completada com zeros até um múltiplo de 8 bytes)
+#   geom       4 float64 por forma
+#   xform      3x2 float64 por forma (transformação afim 2D)
+# Tudo em little-endian. Como cada seção é um array contíguo, abrir a cena é só mapear o arquivo na memória
+
+MAGIC = b'SHPSCENE'
+VERSION = 1
+HEADER = struct.Struct('<8sIQ12x')
+
+def section_offsets(count): # Posição de cada seção no arquivo e o tamanho total
+    kind = HEADER.size
+    geom = kind + (count + 7) // 8 * 8
+    xform = geom + count * 4 * 8
+    return kind, geom, xform, xform + count * 6 * 8
+
+def file_mode(path): # Permissões do arquivo existente, ou as de um arquivo novo criado com open (0666 menos a umask)
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+# Grava a cena em blocos, direto nas posições finais de cada seção: as formas podem vir de qualquer fonte
+# (inclusive geradas aos poucos) sem que a cena inteira precise existir em memória
+# Os dados vão para um arquivo temporário no mesmo diretório, que só substitui o destino no close. Assim o
+# arquivo de origem de uma cena carregada (cujos arrays ainda são mapeados dele) não é truncado enquanto
+# ela é gravada de volta, e um erro no meio da gravação não estraga a cena anterior
+class SceneWriter(object):
+    def __init__(self, path, count):
+        self.path = path
+        self.count = count
+        self.written = 0
+        self.offsets = section_offsets(count)
+        fd, self.temp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".scene-", suffix=".tmp")
+        self.file = os.fdopen(fd, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, count))
+        self.file.truncate(self.offsets[3])
+
+    def write(self, kind, geom, xform): # Acrescenta um bloco de formas (arrays com a mesma quantidade de linhas)
+        n = len(kind)
+        if self.written + n > self.count:
+            raise ValueError("mais formas do que o informado no cabeçalho")
+        for offset, data, dtype, row in zip(self.offsets, (kind, geom, xform), ('<u1', '<f8', '<f8'), (1, 32, 48)):
+            self.file.seek(offset + self.written * row)
+            self.file.write(memoryview(np.ascontiguousarray(data, dtype=dtype))) # Sem cópia quando já está no formato
+        self.written += n
+
+    def close(self):
+        self.file.close()
+        if self.written != self.count:
+            os.remove(self.temp)
+            raise ValueError("esperadas %d formas, recebidas %d" % (self.count, self.written))
+        os.chmod(self.temp, file_mode(self.path)) # O mkstemp cria o arquivo só para o dono (0600)
+        os.replace(self.temp, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else: # Não esconde o erro original com o da contagem e mantém o arquivo anterior
+            self.file.close()
+            os.remove(self.temp)
+
+def save_scene(path, store, chunk=65536): # Grava as formas do store, bloco a bloco, a partir dos próprios arrays
+    n = store.count
+    with SceneWriter(path, n) as writer:
+        for start in range(0, n, chunk):
+            end = min(start + chunk, n)
+            writer.write(store.kind[start:end], store.geom[start:end], store.xform[start:end])
+
+def load_scene(path): # Mapeia o arquivo na memória e retorna os arrays (kind, geom, xform)
+    with open(path, 'rb') as f:
+        magic, version, count = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("%s não é um arquivo de cena" % path)
+    if version != VERSION:
+        raise ValueError("versão de cena %d não suportada" % version)
+    kind, geom, xform, end = section_offsets(count)
+    if count == 0: # Arquivos sem formas não têm o que mapear
+        return np.zeros(0, np.uint8), np.zeros((0, 4)), np.zeros((0, 3, 2))
+    # mode='c': alterações nas formas carregadas ficam só na memória, sem tocar no arquivo
+    return (np.memmap(path, '<u1', 'c', kind, (count,)),
+            np.memmap(path, '<f8', 'c', geom, (count, 4)),
+            np.memmap(path, '<f8', 'c', xform, (count, 3, 2)))
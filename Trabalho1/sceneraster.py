@@ -0,0 +1,112 @@
+import numpy as np
+from PIL import Image
+from lineraster import line_samples, line_spans
+
+# Rasterizador em software para desenhar a cena sem janela (miniaturas, testes em máquinas sem tela)
+# Recebe os mesmos arrays de vértices (x, y, z) enviados ao OpenGL e segue as mesmas regras: um pixel é
+# pintado quando seu centro cai dentro do triângulo, as linhas acendem um pixel por coluna (ou linha) do
+# eixo principal (common/lineraster.py), e o teste de profundidade é GL_LESS com z na janela = (1 - z) / 2, como no gluOrtho2D.
+# As coordenadas são as do mundo do ShapeEditor: x para a direita e y para baixo, em pixels
+
+max_pixels = 1 << 21 # Quantidade máxima de pixels processados de uma vez
+
+def to_rgba8(color): # Cor do OpenGL (componentes entre 0 e 1) para bytes
+    color = tuple(color) + (1.0,) * (4 - len(color))
+    return np.round(np.clip(color, 0, 1) * 255).astype(np.uint8)
+
+def chunks(counts, limit): # Divide os itens em grupos cuja soma de counts não passa de limit (ou um item só)
+    ends = np.cumsum(counts)
+    start = 0
+    while start < len(counts):
+        base = ends[start - 1] if start else 0
+        stop = max(int(np.searchsorted(ends, base + limit, side='right')), start + 1)
+        yield start, stop
+        start = stop
+
+class Framebuffer(object):
+    def __init__(self, width, height, background=(0, 0, 0, 1)):
+        self.width, self.height = width, height
+        self.color = np.empty((height, width, 4), dtype=np.uint8)
+        self.color[:] = to_rgba8(background)
+        self.depth = np.ones((height, width)) # Valor de glClearDepth padrão
+
+    def plot(self, rows, cols, depth, color): # Teste de profundidade e escrita dos fragmentos de uma mesma cor
+        ok = (rows >= 0) & (rows < self.height) & (cols >= 0) & (cols < self.width)
+        rows, cols, depth = rows[ok], cols[ok], depth[ok]
+        ok = depth < self.depth[rows, cols]
+        rows, cols, depth = rows[ok], cols[ok], depth[ok]
+        np.minimum.at(self.depth, (rows, cols), depth)
+        won = depth == self.depth[rows, cols] # Entre fragmentos no mesmo pixel, fica o mais próximo
+        self.color[rows[won], cols[won]] = to_rgba8(color)
+
+    def triangles(self, vertices, color): # vertices: (3k x 3), três vértices (x, y, z) por triângulo
+        v = np.asarray(vertices, dtype=np.float64).reshape(-1, 3, 3)
+        # Orientação positiva para todos; triângulos degenerados não cobrem nenhum pixel
+        area = self.edge(v[:, 0], v[:, 1], v[:, 2, :2])
+        v = np.where((area < 0)[:, None, None], v[:, [0, 2, 1]], v)[area != 0]
+
+        # Linhas de pixels cujos centros (r + 0.5) caem na altura do triângulo
+        first = np.maximum(np.ceil(v[:, :, 1].min(axis=1) - 0.5), 0)
+        last = np.minimum(np.floor(v[:, :, 1].max(axis=1) - 0.5), self.height - 1)
+        counts = np.maximum(last - first + 1, 0).astype(np.int64)
+        first = first.astype(np.int64)
+        for start, stop in chunks(counts, max_pixels // self.width):
+            self.scanlines(v[start:stop], first[start:stop], counts[start:stop], color)
+
+    def scanlines(self, v, first, counts, color): # Preenche os triângulos linha a linha, só nos pixels cobertos
+        tri = np.repeat(np.arange(len(v)), counts)
+        row = first[tri] + np.arange(len(tri)) - np.repeat(np.cumsum(counts) - counts, counts)
+        y = row + 0.5
+        a, b, c = v[tri, 0], v[tri, 1], v[tri, 2]
+
+        # Em cada linha, cada aresta s -> e é uma restrição A x + K >= 0 (> 0 fora das arestas de cima ou da esquerda)
+        lo = np.zeros(len(tri))
+        hi = np.full(len(tri), self.width - 1.0)
+        for s, e in ((b, c), (c, a), (a, b)):
+            A = s[:, 1] - e[:, 1]
+            K = (e[:, 0] - s[:, 0]) * (y - s[:, 1]) + (e[:, 1] - s[:, 1]) * s[:, 0]
+            tl = self.top_left(s, e)
+            x = np.clip(-K / np.where(A == 0, 1, A), -1, self.width) - 0.5
+            lo = np.where(A > 0, np.maximum(lo, np.where(tl, np.ceil(x), np.floor(x) + 1)), lo)
+            hi = np.where(A < 0, np.minimum(hi, np.where(tl, np.floor(x), np.ceil(x) - 1)), hi)
+            hi = np.where((A == 0) & ~((K > 0) | ((K == 0) & tl)), -1, hi)
+        lo, hi = lo.astype(np.int64), hi.astype(np.int64)
+
+        spans = np.maximum(hi - lo + 1, 0)
+        span = np.repeat(np.arange(len(tri)), spans)
+        cols = lo[span] + np.arange(len(span)) - np.repeat(np.cumsum(spans) - spans, spans)
+        rows = row[span]
+        p = np.stack([cols + 0.5, rows + 0.5], axis=1)
+        a, b, c = a[span], b[span], c[span]
+        w = [self.edge(b, c, p), self.edge(c, a, p), self.edge(a, b, p)] # Peso de a, b e c
+        area = w[0] + w[1] + w[2]
+        z = (w[0] * a[:, 2] + w[1] * b[:, 2] + w[2] * c[:, 2]) / np.where(area == 0, 1, area)
+        self.plot(rows, cols, (1 - z) / 2, color)
+
+    def lines(self, vertices, color): # vertices: (2k x 3), dois vértices (x, y, z) por segmento, largura de 1 pixel
+        v = np.asarray(vertices, dtype=np.float64).reshape(-1, 2, 3)
+        major, first, counts = line_spans(v[:, 0, :2], v[:, 1, :2], (self.width, self.height)) # Só dentro da imagem
+        for start, stop in chunks(counts, max_pixels):
+            a, b = v[start:stop, 0], v[start:stop, 1]
+            seg, m, t = line_samples(a[:, :2], b[:, :2], major[start:stop], first[start:stop], counts[start:stop])
+            axis = major[start:stop][seg]
+            p = a[seg] + t[:, None] * (b[seg] - a[seg])
+            minor = np.floor(np.clip(p[np.arange(len(seg)), 1 - axis], -1, max(self.width, self.height))).astype(np.int64)
+            cols = np.where(axis == 0, m, minor)
+            rows = np.where(axis == 0, minor, m)
+            self.plot(rows, cols, (1 - p[:, 2]) / 2, color)
+
+    @staticmethod
+    def edge(a, b, p): # Função de aresta: positiva à direita de a -> b com y para baixo
+        return (b[:, 0] - a[:, 0]) * (p[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (p[:, 0] - a[:, 0])
+
+    @staticmethod
+    def top_left(a, b): # Arestas de cima ou da esquerda ficam com os pixels exatamente sobre elas
+        dx, dy = b[:, 0] - a[:, 0], b[:, 1] - a[:, 1]
+        return ((dy == 0) & (dx > 0)) | (dy < 0)
+
+    def image(self):
+        return Image.fromarray(self.color, 'RGBA')
+
+    def save(self, path):
+        self.image().save(path)
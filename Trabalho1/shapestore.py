@@ -0,0 +1,148 @@
+import math
+import numpy as np
+
+# Armazenamento das formas em arrays contíguos (estrutura de arrays), em vez de um objeto por forma
+# com duas matrizes 4x4. Cada forma ocupa uma linha de cada array:
+#   kind   tipo da forma (RECT ou CIRCLE)
+#   geom   retângulo: x0, y0, x1, y1 (cantos opostos); círculo: cx, cy, raio, 0
+#   xform  transformação afim 2D na convenção de vetor linha do pyrr: p' = p @ xform[:2] + xform[2]
+#   inv    transformação inversa, no mesmo formato, calculada só quando um teste de ponto precisa dela
+#          (inv_valid indica quais linhas de inv estão atualizadas)
+# Operações em lote (caixas envolventes, teste de ponto, desenho) trabalham direto sobre esses arrays
+
+RECT, CIRCLE = 0, 1
+
+IDENTITY = np.array([[1.0, 0.0], [0.0, 1.0], [0.0, 0.0]])
+
+def affine_from_matrix44(m): # Parte 2D (linhas 0, 1 e 3; colunas 0 e 1) de uma matriz 4x4 do pyrr
+    m = np.asarray(m, dtype=np.float64)
+    return m[[0, 1, 3], :2]
+
+def matrix44_from_affine(a): # Matriz 4x4 do pyrr equivalente à transformação afim 2D
+    m = np.identity(4)
+    m[:2, :2] = a[:2]
+    m[3, :2] = a[2]
+    return m
+
+def translated(a, dx, dy): # a seguida de uma translação
+    b = a.copy()
+    b[2] += dx, dy
+    return b
+
+def around(a, l, cx, cy): # a seguida da transformação linear l = ((l00, l01), (l10, l11)) em torno do ponto (cx, cy)
+    # p' = (p @ A + t - c) @ l + c, ou seja, A' = A @ l e t' = (t - c) @ l + c, com só operações escalares
+    (a00, a01), (a10, a11), (tx, ty) = a.tolist()
+    (l00, l01), (l10, l11) = l
+    tx, ty = tx - cx, ty - cy
+    return np.array([[a00 * l00 + a01 * l10, a00 * l01 + a01 * l11],
+                     [a10 * l00 + a11 * l10, a10 * l01 + a11 * l11],
+                     [tx * l00 + ty * l10 + cx, tx * l01 + ty * l11 + cy]])
+
+def rotation(angle): # Rotação 2D na convenção do pyrr (a mesma de create_from_eulers([0, -angle, 0]))
+    c, s = math.cos(angle), math.sin(angle)
+    return (c, s), (-s, c)
+
+def axis_scale(ux, uy, k): # Escala por k ao longo do eixo unitário (ux, uy): I + (k - 1) u uᵀ
+    k -= 1
+    return (1 + k * ux * ux, k * ux * uy), (k * ux * uy, 1 + k * uy * uy)
+
+def grow(a): # Dobra a quantidade de linhas de um array (no mínimo 16 linhas novas, para arrays vazios)
+    return np.concatenate([a, np.zeros((max(len(a), 16),) + a.shape[1:], dtype=a.dtype)])
+
+class ShapeStore(object):
+    def __init__(self, capacity=16):
+        self.count = 0
+        self.kind = np.zeros(capacity, dtype=np.uint8)
+        self.geom = np.zeros((capacity, 4))
+        self.xform = np.zeros((capacity, 3, 2))
+        self.inv = np.zeros((capacity, 3, 2))
+        self.inv_valid = np.zeros(capacity, dtype=bool)
+
+    def add(self, kind, geom, xform=IDENTITY): # Acrescenta uma forma e retorna sua posição
+        if self.count == len(self.kind): # Dobra a capacidade quando os arrays enchem
+            self.kind = grow(self.kind)
+            self.geom = grow(self.geom)
+            self.xform = grow(self.xform)
+            self.inv = grow(self.inv)
+            self.inv_valid = grow(self.inv_valid)
+        i = self.count
+        self.kind[i] = kind
+        self.geom[i] = geom
+        self.set_transform(i, xform)
+        self.count += 1
+        return i
+
+    def assign(self, kind, geom, xform): # Troca todas as formas pelas dos arrays dados (usados sem cópia)
+        self.count = len(kind)
+        self.kind, self.geom, self.xform = kind, geom, xform
+        self.inv = np.zeros((self.count, 3, 2))
+        self.inv_valid = np.zeros(self.count, dtype=bool)
+
+    def set_transform(self, i, xform): # Troca a transformação da forma i; a inversa fica para o próximo teste de ponto
+        self.xform[i] = xform
+        self.inv_valid[i] = False
+
+    def update_inverses(self, idx): # Calcula, em lote, as inversas desatualizadas entre as formas de idx
+        idx = np.asarray(idx, dtype=np.int64)
+        idx = idx[~self.inv_valid[idx]]
+        if len(idx):
+            a = self.xform[idx]
+            # Inversa de [[a, b], [c, d]] é [[d, -b], [-c, a]] / det; a translação inversa é -t @ inversa
+            det = a[:, 0, 0] * a[:, 1, 1] - a[:, 0, 1] * a[:, 1, 0]
+            with np.errstate(divide='ignore', invalid='ignore'): # Forma degenerada (escala 0): inversa inválida, não contém nada
+                linear = np.stack([np.stack([a[:, 1, 1], -a[:, 0, 1]], 1), np.stack([-a[:, 1, 0], a[:, 0, 0]], 1)], 1) / det[:, None, None]
+                self.inv[idx, :2] = linear
+                self.inv[idx, 2] = -np.einsum('nj,njk->nk', a[:, 2], linear)
+            self.inv_valid[idx] = True
+
+    def inverse(self, i): # Inversa da transformação da forma i, calculada agora se estiver desatualizada
+        if not self.inv_valid[i]:
+            self.update_inverses([i])
+        return self.inv[i]
+
+    def center(self, i): # Centro transformado da forma i, sem criar arrays intermediários
+        x0, y0, x1, y1 = self.geom[i].tolist()
+        if self.kind[i] == RECT:
+            x0, y0 = (x0 + x1) / 2, (y0 + y1) / 2
+        (a, b), (c, d), (tx, ty) = self.xform[i].tolist()
+        return x0 * a + y0 * c + tx, x0 * b + y0 * d + ty
+
+    def contains_point(self, i, x, y): # Se o ponto (x, y) está dentro da forma i, com aritmética escalar
+        (a, b), (c, d), (tx, ty) = self.inverse(i).tolist()
+        px, py = x * a + y * c + tx, x * b + y * d + ty # Desfaz a transformação
+        x0, y0, x1, y1 = self.geom[i].tolist()
+        if self.kind[i] == RECT:
+            return min(x0, x1) <= px <= max(x0, x1) and min(y0, y1) <= py <= max(y0, y1)
+        return (px - x0) ** 2 + (py - y0) ** 2 <= x1 * x1
+
+    def all(self): # Posições de todas as formas
+        return np.arange(self.count)
+
+    def centers(self, idx): # Centros das formas já transformados
+        g, a = self.geom[idx], self.xform[idx]
+        local = np.where((self.kind[idx] == RECT)[:, None], (g[:, :2] + g[:, 2:]) / 2, g[:, :2])
+        return np.einsum('ni,nij->nj', local, a[:, :2]) + a[:, 2]
+
+    def bounds(self, idx): # Caixas [xmin, ymin, xmax, ymax] das formas transformadas
+        g, a = self.geom[idx], self.xform[idx]
+        linear, translation = a[:, :2], a[:, 2]
+
+        # Retângulos: caixa dos quatro cantos transformados
+        corners = np.stack([g[:, [0, 1]], g[:, [2, 1]], g[:, [2, 3]], g[:, [0, 3]]], axis=1) @ linear + translation[:, None]
+        rect = np.concatenate([corners.min(axis=1), corners.max(axis=1)], axis=1)
+
+        # Círculos: o círculo transformado é uma elipse, cujas meia largura e meia altura vêm das colunas da parte linear
+        center = np.einsum('ni,nij->nj', g[:, :2], linear) + translation
+        extent = g[:, 2:3] * np.sqrt((linear ** 2).sum(axis=1))
+        circle = np.concatenate([center - extent, center + extent], axis=1)
+
+        return np.where((self.kind[idx] == RECT)[:, None], rect, circle)
+
+    def contains(self, idx, x, y): # Para cada forma de idx, se o ponto (x, y) está dentro dela
+        self.update_inverses(idx)
+        g, inv = self.geom[idx], self.inv[idx]
+        p = np.einsum('j,njk->nk', np.array([x, y], dtype=np.float64), inv[:, :2]) + inv[:, 2] # Desfaz a transformação
+        in_rect = ((np.minimum(g[:, 0], g[:, 2]) <= p[:, 0]) & (p[:, 0] <= np.maximum(g[:, 0], g[:, 2])) &
+                   (np.minimum(g[:, 1], g[:, 3]) <= p[:, 1]) & (p[:, 1] <= np.maximum(g[:, 1], g[:, 3])))
+        in_circle = ((p - g[:, :2]) ** 2).sum(axis=1) <= g[:, 2] ** 2
+        return np.where(self.kind[idx] == RECT, in_rect, in_circle)
@@ -0,0 +1,86 @@
+import ctypes
+import numpy as np
+from OpenGL.GL import *
+from puzzle import REMOVED
+
+__all__ = ["CubeRenderer"]
+
+class CubeRenderer(object):
+    """Draws all the cubes still on the board with a single glDrawArrays call.
+    The vertices of every cube (position, normal, texture coordinate and picking color, interleaved) are
+    expanded with NumPy from the board arrays into one vertex buffer, which is rebuilt only when the board
+    version changes, that is, when some cube changes state or moves.
+    """
+
+    floats = 11 # Floats per vertex: position (3), normal (3), texture coordinate (2), picking color (3)
+
+    def __init__(self, n, faces, tex_coord):
+        """Precomputes the mesh of a cube and the rest position and picking color of every cube.
+        @param n: number of cubes along each side of the board.
+        @param faces: (normal, corners) of each face, corners in units of half the cube side.
+        @param tex_coord: texture coordinates of the faces for each removal direction.
+        """
+        size = 1 / n
+        half = size * 0.8 / 2
+        self.corners = np.array([corner for normal, corners in faces for corner in corners], dtype=np.float32) * half
+        self.normals = np.repeat(np.array([normal for normal, corners in faces], dtype=np.float32), 4, axis=0)
+        self.texcoords = np.zeros((7, len(self.corners), 2), dtype=np.float32) # Indexed by direction, row 0 unused
+        for direction, coords in tex_coord.items():
+            self.texcoords[direction] = np.reshape(coords, (-1, 2))
+        ijk = np.indices((n, n, n)).reshape(3, -1).T # Row of each cube name
+        self.centers = ((ijk - (n - 1) / 2) * size).astype(np.float32)
+        self.colors = ((ijk + 1) / n).astype(np.float32) # Same colors read back by pick
+        self.vbo = None
+        self.count = 0
+        self.board = None
+        self.version = None
+
+    def vertices(self, board):
+        """Returns the (vertices x floats) float32 array of the cubes not removed yet, displaced by their animations.
+        @param board: puzzle.Board with the state of every cube.
+        """
+        live = np.flatnonzero((board.states & REMOVED) == 0)
+        centers = self.centers[live] + board.offsets().reshape(-1, 3)[live]
+        data = np.empty((len(live), len(self.corners), self.floats), dtype=np.float32)
+        data[..., 0:3] = centers[:, None] + self.corners
+        data[..., 3:6] = self.normals
+        data[..., 6:8] = self.texcoords[board.directions[live]]
+        data[..., 8:11] = self.colors[live, None]
+        return data.reshape(-1, self.floats)
+
+    def update(self, board):
+        """Uploads the vertices again if the board changed since the last upload."""
+        if self.vbo is not None and board is self.board and board.version == self.version:
+            return
+        if self.vbo is None: # Can only be created once an OpenGL context exists
+            self.vbo = glGenBuffers(1)
+        data = self.vertices(board)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.count = len(data)
+        self.board, self.version = board, board.version
+
+    def draw(self, flat_colors=False):
+        """Draws the uploaded cubes, textured (texture must be bound) or with their picking colors.
+        @param flat_colors: if True, uses the picking colors instead of texture coordinates.
+        """
+        if not self.count:
+            return
+        stride = self.floats * 4
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glVertexPointer(3, GL_FLOAT, stride, ctypes.c_void_p(0))
+        glNormalPointer(GL_FLOAT, stride, ctypes.c_void_p(12))
+        extra = GL_COLOR_ARRAY if flat_colors else GL_TEXTURE_COORD_ARRAY
+        glEnableClientState(extra)
+        if flat_colors:
+            glColorPointer(3, GL_FLOAT, stride, ctypes.c_void_p(32))
+        else:
+            glTexCoordPointer(2, GL_FLOAT, stride, ctypes.c_void_p(24))
+        glDrawArrays(GL_QUADS, 0, self.count)
+        glDisableClientState(extra)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
@@ -0,0 +1,340 @@
+''' Board logic for Tap Away 3D, independent of OpenGL.
+    Cube names follow tapaway3d: name = (i * n + j) * n + k. Directions are 1: front (+k), 2: back (-k),
+    3: top (+j), 4: bottom (-j), 5: right (+i), 6: left (-i).
+    Each cube lies on three axis lines, one per axis. A cube can be removed when it is the last remaining cube
+    of the line along its own axis, on the side it points to. '''
+
+import random
+import numpy as np
+
+AXIS = {1: 2, 2: 2, 3: 1, 4: 1, 5: 0, 6: 0}
+SIGN = {1: 1, 2: -1, 3: 1, 4: -1, 5: 1, 6: -1}
+DIRECTION = {(AXIS[d], SIGN[d]): d for d in AXIS}
+
+# Unit displacement (x, y, z) = (i, j, k) of each direction, row 0 unused
+UNIT = np.array([[0, 0, 0], [0, 0, 1], [0, 0, -1], [0, 1, 0], [0, -1, 0], [1, 0, 0], [-1, 0, 0]], dtype=np.float32)
+
+# Cube state flags
+REMOVING = 1 # Removal animation running (the cube no longer blocks others)
+REMOVED = 2
+CLICKED = 4 # Click animation running
+RETURNING = 8 # Click animation on its way back
+
+
+def line_of(name, axis, n):
+    ''' Returns (line, position) of the cube on the axis line through it. Lines are numbered 0..n*n-1 on each axis '''
+    i, j, k = name // (n * n), name // n % n, name % n
+    if axis == 0:
+        return j * n + k, i
+    if axis == 1:
+        return i * n + k, j
+    return i * n + j, k
+
+
+def cube_at(axis, line, pos, n):
+    ''' Inverse of line_of: name of the cube at position pos of an axis line '''
+    if axis == 0:
+        return pos * n * n + line
+    if axis == 1:
+        return (line // n * n + pos) * n + line % n
+    return line * n + pos
+
+
+class Board(object):
+    ''' State of every cube in n x n x n arrays indexed [i, j, k]: direction (uint8), state flags (uint8) and the
+        removal and click animation offsets (float32). The flat views directions, states, removal_offsets and
+        click_offsets share the same memory and are indexed by cube name, since (i * n + j) * n + k is the C order
+        of the arrays. Animations are stepped for all cubes at once with array operations, and version changes
+        whenever some cube changes state or moves. '''
+
+    def __init__(self, directions, n):
+        self.n = n
+        self.direction = np.array(directions, dtype=np.uint8).reshape(n, n, n)
+        self.state = np.zeros((n, n, n), dtype=np.uint8)
+        self.removal_offset = np.zeros((n, n, n), dtype=np.float32)
+        self.click_offset = np.zeros((n, n, n), dtype=np.float32)
+        self.directions = self.direction.reshape(-1)
+        self.states = self.state.reshape(-1)
+        self.removal_offsets = self.removal_offset.reshape(-1)
+        self.click_offsets = self.click_offset.reshape(-1)
+        self.removed = 0 # Cubes whose removal animation has finished
+        self.version = 0
+
+    def start_click(self, name):
+        self.states[name] = (self.states[name] | CLICKED) & (0xFF ^ RETURNING)
+        self.click_offsets[name] = 0
+        self.version += 1
+
+    def start_removal(self, name):
+        self.states[name] |= REMOVING
+        self.removal_offsets[name] = 0
+        self.version += 1
+
+    def is_removing(self, name):
+        return bool(self.states[name] & REMOVING)
+
+    def step_removal(self, step, distance):
+        ''' Moves every removing cube by step and marks as removed the ones that travelled distance '''
+        moving = (self.state & REMOVING) != 0
+        if not moving.any():
+            return
+        self.version += 1
+        self.removal_offset[moving] += step
+        done = moving & (self.removal_offset >= distance)
+        self.state[done] = REMOVED
+        self.removed += int(np.count_nonzero(done))
+
+    def step_click(self, step, distance):
+        ''' Moves clicked cubes forward until distance, then back until they reach their place again '''
+        clicked = (self.state & CLICKED) != 0
+        if not clicked.any():
+            return
+        self.version += 1
+        forward = clicked & ((self.state & RETURNING) == 0)
+        self.click_offset[forward] += step
+        self.state[forward & (self.click_offset >= distance)] |= RETURNING
+        back = clicked & ((self.state & RETURNING) != 0)
+        self.click_offset[back] -= step
+        self.state[back & (self.click_offset <= 0)] &= 0xFF ^ (CLICKED | RETURNING)
+
+    def offsets(self):
+        ''' Displacement (n, n, n, 3) of every cube due to its removal or click animation '''
+        step = np.where(self.state & REMOVING, self.removal_offset,
+                        np.where(self.state & CLICKED, self.click_offset, np.float32(0)))
+        return UNIT[self.direction] * step[..., None]
+
+
+class Lines(object):
+    ''' Occupancy of the axis lines of the board. For each line, present marks the positions still holding a cube
+        and lo/hi are the first and last of them (hi < lo when the line is empty). Cubes only leave the board, so
+        the pointers only move inward and all removals together cost O(n^3); asking whether a cube is blocked is
+        a single comparison with the pointer on its side. '''
+
+    def __init__(self, n):
+        self.n = n
+        self.present = [bytearray(b'\x01') * n ** 3 for axis in range(3)] # Indexed by line * n + position
+        self.lo = [[0] * (n * n) for axis in range(3)]
+        self.hi = [[n - 1] * (n * n) for axis in range(3)]
+
+    def blocked(self, cube, direction):
+        ''' True if some cube is still present along direction from cube (which may itself be gone already) '''
+        axis = AXIS[direction]
+        line, pos = line_of(cube, axis, self.n)
+        if SIGN[direction] > 0:
+            return self.hi[axis][line] > pos
+        return self.lo[axis][line] < pos
+
+    def remove(self, cube):
+        ''' Takes cube out of its three lines. Returns the (cube, axis, sign) of every cube that became the first
+            (sign -1) or last (sign 1) of one of these lines '''
+        n = self.n
+        exposed = []
+        for axis in range(3):
+            line, pos = line_of(cube, axis, n)
+            present, row = self.present[axis], line * n
+            present[row + pos] = 0
+            if self.hi[axis][line] == pos:
+                last = pos
+                while last >= 0 and not present[row + last]:
+                    last -= 1
+                self.hi[axis][line] = last
+                if last >= 0:
+                    exposed.append((cube_at(axis, line, last, n), axis, 1))
+            if self.lo[axis][line] == pos:
+                first = pos
+                while first < n and not present[row + first]:
+                    first += 1
+                self.lo[axis][line] = first
+                if first < n:
+                    exposed.append((cube_at(axis, line, first, n), axis, -1))
+        return exposed
+
+
+class Frontier(object):
+    ''' Cubes that can be removed right now, kept up to date as cubes leave the board.
+        A cube becomes free only when it becomes the first or last of its own-direction line, which Lines reports
+        when the cube in front of it is removed, so each removal costs O(affected cubes). Removing cubes of the
+        frontier in any order solves the puzzle, so remaining is also the number of moves left. '''
+
+    def __init__(self, directions, n):
+        self.n = n
+        self.directions = directions
+        self.lines = Lines(n)
+        self.free = set()
+        self.remaining = n ** 3
+        for axis in range(3):
+            for line in range(n * n):
+                self.expose(cube_at(axis, line, 0, n), axis, -1)
+                self.expose(cube_at(axis, line, n - 1, n), axis, 1)
+
+    def expose(self, cube, axis, sign):
+        if DIRECTION[axis, sign] == self.directions[cube]:
+            self.free.add(cube)
+
+    def remove(self, cube):
+        ''' Takes a cube off the board (when its removal starts) and frees the cubes it was blocking '''
+        self.free.discard(cube)
+        self.remaining -= 1
+        for entry in self.lines.remove(cube):
+            self.expose(*entry)
+
+    def hint(self):
+        ''' A cube that can be removed now, or None when the board is empty '''
+        return next(iter(self.free), None)
+
+    def solve(self):
+        ''' Yields a removal order for the cubes left on the board, removing them from this frontier '''
+        while self.free:
+            cube = next(iter(self.free))
+            self.remove(cube)
+            yield cube
+
+
+class Peeler(object):
+    ''' Simulates the game removing free cubes in any order, in O(n^3) overall thanks to Lines.
+        Every cube that becomes the first or last of a line is reported as exposed on that side, because pointing
+        it outward there frees it at once. '''
+
+    def __init__(self, directions, n):
+        self.n = n
+        self.directions = directions
+        self.lines = Lines(n)
+        self.removed = bytearray(n ** 3)
+        self.count = 0
+        self.queue = []
+        self.queued = bytearray(n ** 3)
+        self.exposed = [] # (cube, axis, sign), appended whenever a cube becomes the last of a line on that side
+        for axis in range(3):
+            for line in range(n * n):
+                self.expose(cube_at(axis, line, 0, n), axis, -1)
+                self.expose(cube_at(axis, line, n - 1, n), axis, 1)
+
+    def expose(self, cube, axis, sign):
+        self.exposed.append((cube, axis, sign))
+        if DIRECTION[axis, sign] == self.directions[cube] and not self.queued[cube]:
+            self.queued[cube] = 1
+            self.queue.append(cube)
+
+    def remove(self, cube):
+        ''' Removes a free cube and exposes the cubes that become first or last of its three lines '''
+        self.removed[cube] = 1
+        self.count += 1
+        for entry in self.lines.remove(cube):
+            self.expose(*entry)
+
+    def run(self):
+        ''' Removes free cubes until none is left. Returns how many cubes were removed so far '''
+        while self.queue:
+            self.remove(self.queue.pop())
+        return self.count
+
+
+def cycle_members(directions, n, stuck):
+    ''' Cubes of stuck that lie on a cycle of the "is blocked by" relation, found with Tarjan's strongly connected
+        components in linear time. A cube depends on every stuck cube along its direction, so each line gets a
+        chain of auxiliary nodes per side (chain node t leads to the t-th cube of the line and to the next chain
+        node), which keeps the graph linear in the number of cubes instead of one edge per pair. '''
+    index = {cube: v for v, cube in enumerate(stuck)}
+    edges = [[] for cube in stuck]
+    for axis in range(3):
+        lines = {}
+        for cube in stuck:
+            line, pos = line_of(cube, axis, n)
+            lines.setdefault(line, []).append((pos, cube))
+        for cubes in lines.values():
+            cubes.sort()
+            for sign in (1, -1):
+                order = cubes if sign == 1 else cubes[::-1]
+                pointing = [t for t, (pos, cube) in enumerate(order[:-1])
+                            if AXIS[directions[cube]] == axis and SIGN[directions[cube]] == sign]
+                if not pointing:
+                    continue
+                # Chain nodes for this side, from the cube after the first one pointing along it: node t leads to
+                # the t-th cube (counted in the direction of sign) and to node t + 1; the last node is the cube itself
+                first = len(edges) - pointing[0] - 1
+                last = len(order) - 1
+                for t in range(pointing[0] + 1, last):
+                    edges.append([index[order[t][1]], first + t + 1 if t + 1 < last else index[order[last][1]]])
+                for t in pointing:
+                    edges[index[order[t][1]]].append(first + t + 1 if t + 1 < last else index[order[last][1]])
+
+    # Iterative Tarjan: each frame of the stack holds a node and the iterator over its remaining edges
+    count, cubes = len(edges), len(stuck)
+    low, number = [0] * count, [-1] * count
+    on_stack = bytearray(count)
+    stack, members, counter = [], [], 0
+    for root in range(cubes):
+        if number[root] >= 0:
+            continue
+        number[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+        work = [(root, iter(edges[root]))]
+        while work:
+            v, it = work[-1]
+            for w in it:
+                if number[w] < 0:
+                    number[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = 1
+                    work.append((w, iter(edges[w])))
+                    break
+                if on_stack[w] and number[w] < low[v]:
+                    low[v] = number[w]
+            else:
+                work.pop()
+                if work and low[v] < low[work[-1][0]]: # Returning from v to its parent
+                    low[work[-1][0]] = low[v]
+                if low[v] == number[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = 0
+                        if w < cubes:
+                            component.append(stuck[w])
+                        if w == v:
+                            break
+                    if len(component) > 1:
+                        members.extend(component)
+    return members
+
+
+def repair_directions(directions, n, rng=random):
+    ''' Returns a copy of directions that is guaranteed to be solvable.
+        Free cubes are removed in any order (the game is solvable regardless of the order). If cubes remain, they
+        are blocked by cycles: a cube on a cycle that is already last on some line is turned outward along that
+        line, which frees it, and the removal continues. Only when no cycle cube is exposed is another blocked
+        cube turned. Cubes outside cycles keep their directions. '''
+    directions = list(directions)
+    total = n ** 3
+    peeler = Peeler(directions, n)
+    if peeler.run() == total:
+        return directions
+    stuck = [cube for cube in range(total) if not peeler.removed[cube]]
+    on_cycle = bytearray(total)
+    for cube in cycle_members(directions, n, stuck):
+        on_cycle[cube] = 1
+
+    # Exposed cubes stay exposed until they are removed, so the candidates are kept in two pools (cycle members
+    # first) and removed cubes are discarded only when drawn
+    pools, seen = ([], []), 0
+    while peeler.run() < total:
+        for entry in peeler.exposed[seen:]:
+            pools[not on_cycle[entry[0]]].append(entry)
+        seen = len(peeler.exposed)
+        pool = pools[0] or pools[1]
+        t = rng.randrange(len(pool))
+        pool[t], pool[-1] = pool[-1], pool[t]
+        cube, axis, sign = pool.pop()
+        if peeler.removed[cube]:
+            continue
+        directions[cube] = DIRECTION[axis, sign]
+        peeler.queued[cube] = 1
+        peeler.queue.append(cube)
+    return directions
+
+
+def is_solvable(directions, n):
+    return Peeler(directions, n).run() == n ** 3
@@ -1,5 +1,5 @@
+import os
 import sys
-import random
 import numpy as np
 from math import degrees
 from OpenGL.GLUT import *
@@ -7,30 +7,20 @@ from OpenGL.GLU import *
 from OpenGL.GL import *
 from PIL  import Image
 from arcball import ArcBall
+from puzzle import Board, Frontier, repair_directions
+from cuberenderer import CubeRenderer
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common")) # Shared modules (instrument)
+import instrument
 
 # Selected object
 selected = []
 
-# Set of removed objects
-removed = set()
-
 # size of cube array
 n = 3
 
 # Window dimensions
 width, height = 800, 800
 
-''' Stores each occurrence of cube click animation currently happening.
-    Click animation happens when any cube is clicked even if mouse button is not released.
-    Each cube name (key) is associated with a list containing its removal direction, current step size
-    and a boolean variable that indicates if it is bouncing forward (True) or returning (False). '''
-click_animation = dict()
-
-''' Stores each occurrence of removal animation currently happening.
-    Removal will only happen if mouse doesn't drag after click and no other cube is blocking the removal direction.
-    Each cube name (key) is associated with a list containing its removal direction and current step size. '''
-removal_animation = dict()
-
 # Total distance the cube will travel during removal animation (equal or less than perspective 'far' parameter)
 removal_distance = 7 
 
@@ -83,98 +73,55 @@ tex_coord = {
         [(0.0, 0.8),(1.0, 0.8),(1.0, 1.0),(0.0, 1.0)]] # left face (blank)
 }
 
-def find_cube_coord(name):
-    ''' Finds coordinates (i,j,k) of cube relative to the big cube '''
-    global n
-    i = name // n**2  # front-back direction
-    remainder = name % n**2  
-    j = remainder // n  # top-bottom direction 
-    k = remainder % n  # left-right direction
-    return i,j,k
-
-def find_cube_name(i,j,k):
-    ''' Finds name of cube from (i,j,k) coordinates '''
-    return i * n**2 + j * n + k
+# Normal and corners (in units of half the cube side) of each cube face, in the same order as tex_coord
+cube_faces = [
+    ((0, 0, 1), [(-1, -1, 1), (1, -1, 1), (1, 1, 1), (-1, 1, 1)]), # front face
+    ((0, 0, -1), [(1, -1, -1), (-1, -1, -1), (-1, 1, -1), (1, 1, -1)]), # back face
+    ((0, 1, 0), [(-1, 1, 1), (1, 1, 1), (1, 1, -1), (-1, 1, -1)]), # top face
+    ((0, -1, 0), [(1, -1, 1), (-1, -1, 1), (-1, -1, -1), (1, -1, -1)]), # bottom face
+    ((1, 0, 0), [(1, -1, 1), (1, -1, -1), (1, 1, -1), (1, 1, 1)]), # right face
+    ((-1, 0, 0), [(-1, -1, -1), (-1, -1, 1), (-1, 1, 1), (-1, 1, -1)]) # left face
+]
 
 def generate_random_directions():
     ''' Generates random cube removal directions as the following:
     1: front; 2: back; 3:top; 4: bottom; 5: right; 6: left '''
-    # Generates random directions
-    directions = []
-    for name in range(n**3):
-        random_dir = random.randint(1, 6)
-        directions += [random_dir]       
-    return directions
+    return np.random.randint(1, 7, n**3).astype(np.uint8)
 
 def validate_directions(directions):
     ''' Verifies if there isn't cycles in the system making it impossible to be solved. If there is, 
         changes directions vector to appropriate values. Returns the corrected directions array. '''
     
-    available_directions = [1,2,3,4,5,6]
-    
-    ''' Verifying existence of cycles among immediate and non immediate cubes (other intercalating cubes exist inside the cycle)
-    Due to system configuration, game must be solvable regardless the order in which the cubes are deleted. Thus, we can verify 
-    solvability by simulating a random deletion order. Here, cubes are deleted one by one in a loop as long as they are not blocked 
-    by another cube. If cubes can no longer be removed and system is not solved, it means a cycle exists. In this case, the cubes 
-    blocked will have their directions randomized again in directions array until all (or all minus one) cubes are removed. '''
-    removed_cubes = set() # Stores coordinates of removed cubes during simulation
-    while len(removed_cubes) < n**3 - 1: # Repeat until only one or no cube is left
-        removal_count = 0
-        for i in range(n):
-            for j in range(n):
-                for k in range(n):
-                    current_cube = i,j,k
-                    cube_name = find_cube_name(*current_cube)
-                    if current_cube in removed_cubes:
-                        continue
-                    else:
-                        # Jump to next non eliminated cube in the same direction. If there isn't one, next will be 'None', meaning cube is free
-                        next_cube = get_next_cube(current_cube,directions[cube_name])
-                        while next_cube in removed_cubes:
-                            next_cube = get_next_cube(next_cube,directions[cube_name])
-                        if next_cube == None:
-                            removed_cubes.add(current_cube)
-                            removal_count += 1
-        if removal_count > 0: # At least one cube was removed, no cycle detected yet
-            continue
-        else: # Cycle detected, cubes are blocked
-            for cube in range(n**3):
-                if find_cube_coord(cube) not in removed_cubes:
-                    current_direction = directions[cube]
-                    directions[cube] = random.choice([x for x in available_directions if x != current_direction])
-    return directions
-
-def get_next_cube(cube, direction):
-    ''' Gets coordinates of cube pointed to '''
-    i, j, k = cube
-    if direction == 1:  # Front
-        if k == n - 1:
-            return None
-        return i, j, k + 1
-    elif direction == 2:  # Back
-        if k == 0:
-            return None
-        return i, j, k - 1
-    elif direction == 3:  # Top
-        if j == n - 1:
-            return None
-        return i, j + 1, k
-    elif direction == 4:  # Bottom
-        if j == 0:
-            return None
-        return i, j - 1, k
-    elif direction == 5:  # Right
-        if i == n - 1:
-            return None
-        return i + 1, j, k
-    elif direction == 6:  # Left
-        if i == 0:
-            return None
-        return i - 1, j, k
-
-''' GLOBAL - Random cube directions validated to ensure system's solvability.
-    Index of each direction is equivalent to its associated cube name. '''
-directions = validate_directions(generate_random_directions())
+    ''' Due to system configuration, game must be solvable regardless the order in which the cubes are deleted. Thus, we can verify 
+    solvability by removing free cubes until none is left, which takes linear time when each axis line keeps its first and last
+    remaining cube (see puzzle.Peeler). If cubes remain, the cycles among them are found as strongly connected components of the
+    "is blocked by" graph, and only cubes in those cycles have their directions changed (see puzzle.repair_directions). '''
+    return np.array(repair_directions(np.asarray(directions).tolist(), n), dtype=np.uint8)
+
+def new_game(valid_directions):
+    ''' Starts a game with the given (validated) directions, setting the globals below '''
+    global board, directions, frontier
+
+    # State of each cube in n x n x n arrays: direction, flags telling if it is being removed, removed or bouncing
+    # after a click, and the offsets of both animations. Click animation happens when any cube is clicked even if
+    # mouse button is not released. Removal will only happen if mouse doesn't drag after click and no other cube is
+    # blocking the removal direction
+    board = Board(valid_directions, n)
+
+    # Random cube directions validated to ensure system's solvability. Index of each direction is equivalent to
+    # its associated cube name (a view of board.direction)
+    directions = board.directions
+
+    # Cubes that can be removed right now, with the occupancy of the rows, columns and pillars of the big cube
+    # (frontier.lines) and the number of moves left. A cube leaves it as soon as its removal animation starts,
+    # since from then on it no longer blocks other cubes
+    frontier = Frontier(directions.tolist(), n)
+
+''' GLOBAL - Random game validated to ensure system's solvability '''
+new_game(validate_directions(generate_random_directions()))
+
+# When True, idle removes one free cube per frame until the puzzle is solved
+auto_solve = False
 
 
 def loadTexture(filename):
@@ -204,184 +151,43 @@ def loadTexture(filename):
 
 
 def draw_scene(flatColors = False):
-    "Draws the scene emitting a 'name' for each cube"
-    global n, directions, removal_animation, click_animation, textureId_arrow, matrix
+    "Draws the scene, with a color identifying each cube when flatColors is True"
+    global board, textureId_arrow, cube_renderer, matrix
     glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
     glMatrixMode(GL_MODELVIEW)
     glLoadIdentity()
     glTranslatef(0, 0, -3)
     glRotatef(-80, 1, 0, 0)
     glMultMatrixd (matrix)
-    size = 1 / n
-    for i in range(n):
-        x = i - (n - 1) / 2
-        for j in range(n):
-            y = j - (n - 1) / 2
-            for k in range(n):
-                z = k - (n - 1) / 2
-                name = (i * n + j) * n + k  # Number associated to each cube, from 0 to (n^3-1)
-                if flatColors:
-                    glColor3f((i+1)/n, (j+1)/n, (k+1)/n)
-                # Ignore removed objects
-                if name in removed:
-                    continue
-                glLoadName(name)
-                glPushMatrix()
-                glTranslatef(x * size, y * size, z * size)
-
-                if name in removal_animation:
-                    removal_direction = removal_animation.get(name)[0]
-                    removal_step = removal_animation.get(name)[1]
-
-                    if removal_direction == 1:  # Front
-                        glTranslatef(0, 0, removal_step)
-                    elif removal_direction == 2:  # Back
-                        glTranslatef(0, 0, -removal_step)
-                    elif removal_direction == 3:  # Top
-                        glTranslatef(0, removal_step, 0)
-                    elif removal_direction == 4:  # Bottom
-                        glTranslatef(0, -removal_step, 0)
-                    elif removal_direction == 5:  # Right
-                        glTranslatef(removal_step, 0, 0)
-                    elif removal_direction == 6:  # Left
-                        glTranslatef(-removal_step, 0, 0)
-                
-                elif name in click_animation:
-                    click_direction = click_animation.get(name)[0]
-                    click_step = click_animation.get(name)[1]
-
-                    if click_direction == 1:  # Front
-                        glTranslatef(0, 0, click_step)
-                    elif click_direction == 2:  # Back
-                        glTranslatef(0, 0, -click_step)
-                    elif click_direction == 3:  # Top
-                        glTranslatef(0, click_step, 0)
-                    elif click_direction == 4:  # Bottom
-                        glTranslatef(0, -click_step, 0)
-                    elif click_direction == 5:  # Right
-                        glTranslatef(click_step, 0, 0)
-                    elif click_direction == 6:  # Left
-                        glTranslatef(-click_step, 0, 0)
-
-                if flatColors:
-                    glutSolidCube(size*0.8)
-                else:
-                    # Bind the texture and enable texture mapping
-                    glEnable(GL_TEXTURE_2D)
-                    glBindTexture(GL_TEXTURE_2D, textureId_arrow)
-
-                    # Draw each face of the cube with the texture applied
-                    glBegin(GL_QUADS)
-                    
-                    dir = directions[name]
-
-                    # Front Face
-                    glNormal3f(0, 0, 1)
-                    glTexCoord2f(*tex_coord[dir][0][0]) 
-                    glVertex3f(-size*0.8/2, -size*0.8/2, size*0.8/2)  # Bottom Left Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][0][1])
-                    glVertex3f(size*0.8/2, -size*0.8/2, size*0.8/2)  # Bottom Right Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][0][2])
-                    glVertex3f(size*0.8/2, size*0.8/2, size*0.8/2)  # Top Right Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][0][3])
-                    glVertex3f(-size*0.8/2, size*0.8/2, size*0.8/2)  # Top Left Of The Texture and Quad
-
-                    # Back Face
-                    glNormal3f(0,0,-1)
-                    glTexCoord2f(*tex_coord[dir][1][0])
-                    glVertex3f(size*0.8/2, -size*0.8/2, -size*0.8/2)  # Bottom Left Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][1][1])
-                    glVertex3f(-size*0.8/2, -size*0.8/2, -size*0.8/2)  # Bottom Right Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][1][2])
-                    glVertex3f(-size*0.8/2, size*0.8/2, -size*0.8/2)  # Top Right Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][1][3])
-                    glVertex3f(size*0.8/2, size*0.8/2, -size*0.8/2)  # Top Left Of The Texture and Quad
-
-                    # Top Face
-                    glNormal3f(0,1,0)
-                    glTexCoord2f(*tex_coord[dir][2][0])
-                    glVertex3f(-size*0.8/2, size*0.8/2, size*0.8/2)  # Bottom Left Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][2][1])
-                    glVertex3f(size*0.8/2, size*0.8/2, size*0.8/2)  # Bottom Right Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][2][2])
-                    glVertex3f(size*0.8/2, size*0.8/2, -size*0.8/2)  # Top Right Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][2][3])
-                    glVertex3f(-size*0.8/2, size*0.8/2, -size*0.8/2)  # Top Left Of The Texture and Quad
-
-                    # Bottom Face
-                    glNormal3f(0,-1,0)
-                    glTexCoord2f(*tex_coord[dir][3][0])
-                    glVertex3f(size*0.8/2, -size*0.8/2, size*0.8/2)  # Bottom Left Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][3][1])
-                    glVertex3f(-size*0.8/2, -size*0.8/2, size*0.8/2)  # Bottom Right Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][3][2])
-                    glVertex3f(-size*0.8/2, -size*0.8/2, -size*0.8/2)  # Top Right Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][3][3])
-                    glVertex3f(size*0.8/2, -size*0.8/2, -size*0.8/2)  # Top Left Of The Texture and Quad
-
-                    # Right face
-                    glNormal3f(1,0,0)
-                    glTexCoord2f(*tex_coord[dir][4][0])
-                    glVertex3f(size*0.8/2, -size*0.8/2, size*0.8/2)  # Bottom Left Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][4][1])
-                    glVertex3f(size*0.8/2, -size*0.8/2, -size*0.8/2)  # Bottom Right Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][4][2])
-                    glVertex3f(size*0.8/2, size*0.8/2, -size*0.8/2)  # Top Right Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][4][3])
-                    glVertex3f(size*0.8/2, size*0.8/2, size*0.8/2)  # Top Left Of The Texture and Quad
-
-                    # Left Face
-                    glNormal3f(-1,0,0)
-                    glTexCoord2f(*tex_coord[dir][5][0])
-                    glVertex3f(-size*0.8/2, -size*0.8/2, -size*0.8/2)  # Bottom Left Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][5][1])
-                    glVertex3f(-size*0.8/2, -size*0.8/2, size*0.8/2)  # Bottom Right Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][5][2])
-                    glVertex3f(-size*0.8/2, size*0.8/2, size*0.8/2)  # Top Right Of The Texture and Quad
-                    glTexCoord2f(*tex_coord[dir][5][3])
-                    glVertex3f(-size*0.8/2, size*0.8/2, -size*0.8/2)  # Top Left Of The Texture and Quad
-
-                    glEnd()
-
-                    # Disable texture mapping
-                    glDisable(GL_TEXTURE_2D)
-
-                glPopMatrix()
+
+    # All cubes are drawn at once from a vertex buffer, rebuilt only when some cube changed or moved
+    cube_renderer.update(board)
+    if flatColors:
+        cube_renderer.draw(flat_colors=True)
+    else:
+        # Bind the texture and enable texture mapping
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, textureId_arrow)
+        cube_renderer.draw()
+        # Disable texture mapping
+        glDisable(GL_TEXTURE_2D)
 
 
 def update_removal_animation():
     "Updates values for cube removal animation"
-    global removal_distance, removed, selected, removal_animation
-
-    if removal_animation: # Verifies if any animation is happening
-        for name in removal_animation.copy():
-            # Update the step size, that is, the distance the cube will travel every frame
-            animation_info = removal_animation.get(name)
-            animation_info[1] += 0.07 # Step size
+    global removal_distance, board
 
-            if animation_info[1] >= removal_distance:
-                # Remove the cube from the scene
-                removed.add(name)
-                del removal_animation[name]
+    # Update the step size, that is, the distance the cube will travel every frame. Cubes that travelled
+    # removal_distance are removed from the scene
+    board.step_removal(0.07, removal_distance)
 
 
 def update_click_animation():
     "Updates values for cube click animation"
-    global click_distance, removed, selected, click_animation
+    global click_distance, board
 
-    if click_animation: # Verifies if any animation is happening
-        for name in click_animation.copy():
-            animation_info = click_animation.get(name)
-            
-            if animation_info[2] == True: # Way forward
-                animation_info[1] += 0.01 # Updates step size
-                if animation_info[1] >= click_distance: 
-                    animation_info[2] = False # Change direction
-
-            if animation_info[2] == False: # Way back
-                animation_info[1] -= 0.01 # Updates step size
-                if animation_info[1] <= 0.0:
-                    del click_animation[name] # Ends animation
+    # Cubes go forward until click_distance and then return
+    board.step_click(0.01, click_distance)
 
 
 def draw_win():
@@ -416,7 +222,7 @@ def draw_win():
 
 
 def display():
-    if len(removed) < n ** 3:
+    if board.removed < n ** 3:
         draw_scene()
     else:
         draw_win()
@@ -444,6 +250,10 @@ def init():
     textureId_arrow = loadTexture("arrow2.jpg")
     textureId_win = loadTexture("youwin.png")
 
+    # Vertex buffer with all the cubes
+    global cube_renderer
+    cube_renderer = CubeRenderer(n, cube_faces, tex_coord)
+
 
 def reshape(w, h):
     global width, height
@@ -475,7 +285,7 @@ def mousePressed(button, state, x, y):
         startx, starty = x, y
         selected = pick(x,y)
         if selected >= 0:
-            click_animation[selected] = [directions[selected], 0.0, True]
+            board.start_click(selected)
 
         global arcball
         arcball = ArcBall ((width/2,height/2,0), width/2)
@@ -489,8 +299,7 @@ def mousePressed(button, state, x, y):
             if selected >= 0:
                 cube_free = verify_removal_possibility(selected)
                 if cube_free:
-                    # Start cube removal animation
-                    removal_animation[selected] = [directions[selected], 0.0]
+                    start_removal(selected)
                 selected = None
     glutPostRedisplay()
 
@@ -508,24 +317,35 @@ def rotatecallback (x, y):
 
 def verify_removal_possibility(cube):
     ''' Verifies if it is possible to remove selected cube, that is, if it is not blocked '''
-    global n, directions, removed, removal_animation
+    global frontier
 
-    cube_coord = find_cube_coord(cube) # cube coordinates
+    # Blocked if the first or last cube still present on the line along its direction lies beyond it
+    return not frontier.lines.blocked(cube, frontier.directions[cube])
 
-    # Jump to next non eliminated cube in the same direction. If there isn't one, next will be 'None', meaning cube is free
-    next_cube_coord = get_next_cube(cube_coord, directions[cube])
-    while True:
-        if next_cube_coord == None: # on border
-            return True
-        else:
-            if find_cube_name(*next_cube_coord) in removed or find_cube_name(*next_cube_coord) in removal_animation:
-                # adjacent cube was removed previously, jump to next one
-                next_cube_coord = get_next_cube(next_cube_coord,directions[cube])
-            else: # cube in the way
-                return False
+
+def start_removal(cube):
+    ''' Starts cube removal animation and takes the cube out of the frontier of free cubes '''
+    if not board.is_removing(cube):
+        frontier.remove(cube)
+        glutSetWindowTitle("Tap Away 3D - %d moves left" % frontier.remaining)
+    board.start_removal(cube)
+
+
+def keyboard(key, x, y):
+    ''' 'h' bounces a cube that can be removed now, 'a' starts or stops solving the puzzle automatically '''
+    global auto_solve
+    if key == b'h':
+        hint = frontier.hint()
+        if hint is not None:
+            board.start_click(hint)
+    elif key == b'a':
+        auto_solve = not auto_solve
+    glutPostRedisplay()
 
 
 def idle():
+    if auto_solve and frontier.free:
+        start_removal(frontier.hint())
     update_removal_animation()
     update_click_animation()
     glutPostRedisplay()
@@ -533,16 +353,25 @@ def idle():
 
 def main():
     glutInit(sys.argv)
+    glutSetOption(GLUT_ACTION_ON_WINDOW_CLOSE, GLUT_ACTION_GLUTMAINLOOP_RETURNS) # Closing the window returns from glutMainLoop, so atexit handlers run
     glutInitDisplayMode (GLUT_DOUBLE | GLUT_RGBA | GLUT_DEPTH | GLUT_MULTISAMPLE)
     glutInitWindowSize (width, height); 
     glutInitWindowPosition (100, 100)
-    glutCreateWindow ("Tap Away 3D")
+    glutCreateWindow ("Tap Away 3D - %d moves left" % frontier.remaining)
     init ()
     glutReshapeFunc(reshape)
     glutDisplayFunc(display)
     glutMouseFunc(mousePressed)
+    glutKeyboardFunc(keyboard)
     glutIdleFunc(idle)
     glutMainLoop()
 
 
-main()
+# Optional timing of callbacks and OpenGL call counts (enabled with PERF_TRACE=file.json)
+instrument.install(globals(), ["display", "draw_scene", "pick", "idle", "update_removal_animation",
+                               "update_click_animation", "verify_removal_possibility", "rotatecallback",
+                               "CubeRenderer.update", "CubeRenderer.draw"],
+                   frame="display", gl_namespaces=[globals(), vars(sys.modules[CubeRenderer.__module__])])
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,276 @@
+import os
+import sys
 import numpy as np
 from OpenGL.GL import *
 from OpenGL.GLUT import *
 from OpenGL.GLU import *
+from PIL import Image, ImageDraw, ImageFont
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "common")) # Módulos compartilhados (instrument, lineraster)
+from bspline import apply_band, basis_cache, clamped_knots, curve_end, homogeneous, project, tessellate_span, uniform_knots
+from curveraster import Canvas
+import instrument
 
 # Parâmetros iniciais
 k = 0
 d = 1
 selected_point = None
+last_point = None # Último ponto clicado, cujo peso é alterado com '+' e '-'
 width, height = 800, 600
 degree_range = (0, 5)
 degree_step = 1
+flatness_tolerance = 0.5 # Distância máxima (em pixels) entre a curva e a polilinha adaptativa
+pick_radius = 12 # Distância máxima (em pixels) do clique até o ponto de controle selecionado
+grid_threshold = 64 # Abaixo dessa quantidade de pontos, a seleção testa todos de uma vez com NumPy
 control_points = np.array([[100 + ((width - 200) / 5) * i, height / 2 + np.random.uniform(-0.5, 0.5) * (height - 200)] for i in range(6)], dtype=np.float32)
-nodes = np.arange(12)
+weights = np.ones(len(control_points)) # Pesos racionais (NURBS); com todos iguais a 1 a curva é uma B-Spline comum
+weight_step = 1.25
+clamped = False # Nós repetidos nas pontas fazem a curva começar e terminar nos pontos extremos
 
-# Pré-computar as funções de base
-base_functions = {}
+# Vetor de nós atual: os uniformes servem para qualquer grau; os fixados nas pontas dependem do grau
+def make_nodes():
+    if clamped:
+        return clamped_knots(len(control_points), d)
+    return uniform_knots(len(control_points), degree_range[1])
 
-# Função B-Spline de Cox-de Boor recursiva
-def B(k, d, nodes):
-    if (k, d) in base_functions:
-        return base_functions[(k, d)]
+nodes = make_nodes()
 
-    if d == 0:
-        def base(u):
-            return 1 if nodes[k] <= u < nodes[k + 1] else 0
-    else:
-        Bk0 = B(k, d - 1, nodes)
-        Bk1 = B(k + 1, d - 1, nodes)
-        def base(u):
-            return ((u - nodes[k]) / (nodes[k + d] - nodes[k])) * Bk0(u) + ((nodes[k + d + 1] - u) / (nodes[k + d + 1] - nodes[k + 1])) * Bk1(u)
-    
-    base_functions[(k, d)] = base
-    return base
-
-# Amostragem da função B-Spline para desenho
-def sample_curve(pts, step=0.01):
-    n = len(pts)
-    b = [B(i, d, nodes) for i in range(n)]
-    sample = []
-    for u in np.arange(d, n, step):
-        sum_point = np.zeros(2, dtype=np.float32)
-        for k, p in enumerate(pts):
-            w = b[k](u)
-            sum_point += w * p
-        sample.append(sum_point)
-    return sample
+# Guarda a última polilinha amostrada e a atualiza localmente quando um único ponto de controle se move
+# O ponto i só influencia o intervalo [t_i, t_i+d+1), então só as amostras desse intervalo são recalculadas.
+# Arrastar um ponto não muda a base, que fica em cache: cada quadro do arraste só combina as linhas da base
+# dessas amostras com os d + 1 pontos de cada uma
+class CurveBuffer(object):
+    def __init__(self, step=0.01):
+        self.step = step
+        self.band = None
+        self.points = None
+        self.version = 0 # Incrementada a cada mudança em points, para saber quando reenviar à GPU
+
+    def update(self, pts, weights): # Reamostra tudo se a base mudou (grau, nós ou quantidade de pontos)
+        band = basis_cache.get(nodes, d, len(pts), self.step)
+        if band is not self.band:
+            self.band = band
+            self.points = project(apply_band(*band, homogeneous(pts, weights))).astype(np.float32)
+            self.version += 1
+        return self.points
+
+    def invalidate(self):
+        self.band = None
+
+    def move_point(self, pts, weights, i): # Recalcula só as amostras afetadas pelo ponto i (posição ou peso)
+        band = basis_cache.get(nodes, d, len(pts), self.step)
+        if band is not self.band:
+            return self.update(pts, weights)
+        # Cada amostra só usa os d + 1 pontos da sua faixa da base: o ponto i entra nas amostras dos intervalos i
+        # até i+d, incluindo a amostra final em t_n quando o último intervalo está entre eles
+        B, span = band
+        lo, hi = np.searchsorted(span, [i, i + d + 1])
+        self.points[lo:hi] = project(apply_band(B[lo:hi], span[lo:hi], homogeneous(pts, weights)))
+        self.version += 1
+        return self.points
+
+# Mesma interface do CurveBuffer, mas cada intervalo de nós é tesselado de forma adaptativa
+# Mover o ponto i só retessela os intervalos i até i+d
+class AdaptiveCurve(object):
+    def __init__(self, tol=0.5):
+        self.tol = tol
+        self.state = None
+        self.points = None
+        self.version = 0
+
+    def update(self, pts, weights):
+        state = (d, len(pts), np.asarray(nodes).tobytes())
+        if state != self.state:
+            self.state = state
+            H = homogeneous(pts, weights)
+            self.spans = {j: tessellate_span(H, j, d, nodes, self.tol, rational=True) for j in range(d, len(pts))}
+            self.join(H)
+        return self.points
+
+    def move_point(self, pts, weights, i):
+        if (d, len(pts), np.asarray(nodes).tobytes()) != self.state:
+            return self.update(pts, weights)
+        H = homogeneous(pts, weights)
+        for j in range(max(i, d), min(i + d + 1, len(pts))):
+            self.spans[j] = tessellate_span(H, j, d, nodes, self.tol, rational=True)
+        self.join(H)
+        return self.points
+
+    def join(self, H): # Junta os intervalos e fecha a polilinha com o ponto final da curva
+        end = project(curve_end(H, d, nodes))[None].astype(np.float32)
+        self.points = np.concatenate([self.spans[j] for j in range(d, len(H))] + [end])
+        self.version += 1
+
+    def invalidate(self):
+        self.state = None
+
+# Buffer de vértices (VBO) com a curva amostrada, reenviado à GPU só quando a curva muda
+class VertexBuffer(object):
+    def __init__(self):
+        self.vbo = None
+        self.key = None
+        self.count = 0
+
+    def draw(self, mode, points, key):
+        if self.vbo is None: # Só pode ser criado depois que existe um contexto OpenGL
+            self.vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        if key != self.key:
+            data = np.ascontiguousarray(points, dtype=np.float32)
+            glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, GL_DYNAMIC_DRAW)
+            self.key = key
+            self.count = len(data)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(2, GL_FLOAT, 0, None)
+        glDrawArrays(mode, 0, self.count)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+# Desenha um array de pontos direto da memória, com uma única chamada
+def draw_array(mode, points):
+    glEnableClientState(GL_VERTEX_ARRAY)
+    glVertexPointer(2, GL_FLOAT, 0, np.ascontiguousarray(points, dtype=np.float32))
+    glDrawArrays(mode, 0, len(points))
+    glDisableClientState(GL_VERTEX_ARRAY)
+
+# Legendas dos pontos de controle, todas desenhadas com uma única chamada
+# Os algarismos são desenhados uma vez numa textura, com a fonte do PIL (a mesma do Canvas), e cada algarismo de
+# cada legenda vira um quad texturizado. A disposição dos quads depende só da quantidade de pontos e é guardada;
+# a cada quadro só as posições das legendas são somadas a ela
+class LabelBatch(object):
+    digits = "0123456789"
+
+    def __init__(self):
+        self.font = ImageFont.load_default()
+        self.texture = None
+        self.count = None # Quantidade de legendas da disposição guardada
+
+    def build_texture(self): # Atlas com os algarismos lado a lado (linha 0 em cima), na opacidade do texto
+        boxes = np.array([self.font.getbbox(c, anchor="ls") for c in self.digits]) # (esquerda, topo, direita, base)
+        self.lefts, self.widths = boxes[:, 0], boxes[:, 2] - boxes[:, 0]
+        self.top, self.bottom = boxes[:, 1].min(), boxes[:, 3].max() # Em relação à linha de base, y para baixo
+        self.starts = np.cumsum(self.widths) - self.widths # Coluna de cada algarismo no atlas
+        self.advance = np.array([self.font.getlength(c) for c in self.digits])
+        atlas = Image.new("L", (int(self.widths.sum()), int(self.bottom - self.top)))
+        draw = ImageDraw.Draw(atlas)
+        for c, start, left in zip(self.digits, self.starts, self.lefts):
+            draw.text((start - left, -self.top), c, font=self.font, anchor="ls", fill=255)
+        self.size = atlas.size
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST) # Um texel por pixel, sem interpolação
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_ALPHA, atlas.size[0], atlas.size[1], 0, GL_ALPHA, GL_UNSIGNED_BYTE, atlas.tobytes())
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+    def layout(self, count): # Quads (relativos à posição da legenda) e coordenadas de textura das legendas 0..count-1
+        glyphs, owner, pens = [], [], []
+        for i in range(count):
+            pen = 0.0
+            for c in str(i):
+                g = self.digits.index(c)
+                glyphs.append(g)
+                owner.append(i)
+                pens.append(pen)
+                pen += self.advance[g]
+        glyphs = np.array(glyphs, dtype=np.int64)
+        x0 = np.array(pens) + self.lefts[glyphs]
+        x1 = x0 + self.widths[glyphs]
+        u0 = self.starts[glyphs] / self.size[0]
+        u1 = (self.starts[glyphs] + self.widths[glyphs]) / self.size[0]
+        # No OpenGL y cresce para cima: a base do algarismo fica em -bottom e o topo em -top; v = 0 é o topo do atlas
+        y0, y1 = np.full(len(glyphs), -self.bottom), np.full(len(glyphs), -self.top)
+        v0, v1 = np.ones(len(glyphs)), np.zeros(len(glyphs))
+        self.corners = np.stack([x0, y0, x1, y0, x1, y1, x0, y1], axis=1).reshape(-1, 2).astype(np.float32)
+        self.tex = np.stack([u0, v0, u1, v0, u1, v1, u0, v1], axis=1).reshape(-1, 2).astype(np.float32)
+        self.owner = np.repeat(np.array(owner, dtype=np.int64), 4) # Legenda de cada vértice
+        self.count = count
+
+    def draw(self, anchors): # anchors: posição (linha de base, à esquerda) da legenda de cada ponto
+        if self.texture is None: # Só pode ser criada depois que existe um contexto OpenGL
+            self.build_texture()
+        if self.count != len(anchors):
+            self.layout(len(anchors))
+        vertices = self.corners + np.asarray(anchors, dtype=np.float32)[self.owner]
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glVertexPointer(2, GL_FLOAT, 0, vertices)
+        glTexCoordPointer(2, GL_FLOAT, 0, self.tex)
+        glDrawArrays(GL_QUADS, 0, len(vertices))
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glDisable(GL_TEXTURE_2D)
+
+# Posição de cada legenda: ao lado do ponto, arredondada para o pixel, para os algarismos caírem inteiros nos pixels
+def label_anchors(points):
+    return np.floor(np.asarray(points, dtype=np.float64) + (8, -8) + 0.5)
+
+fixed_curve = CurveBuffer()
+adaptive_curve = AdaptiveCurve(flatness_tolerance)
+curve = fixed_curve # A tesselação adaptativa (tecla 'a') retessela com de Boor em Python, mais caro a cada arraste
+curve_vbo = VertexBuffer()
+labels = LabelBatch()
+
+# Grade uniforme sobre os pontos de controle para encontrar o ponto clicado sem percorrer todos
+# Cada célula guarda os índices dos pontos que caem nela; mover um ponto só troca ele de célula
+class PointGrid(object):
+    def __init__(self, points, cell=pick_radius):
+        self.cell = cell
+        self.cells = {}
+        self.keys = []
+        for i, p in enumerate(points):
+            key = self.cell_of(p)
+            self.keys.append(key)
+            self.cells.setdefault(key, set()).add(i)
+
+    def cell_of(self, p):
+        return int(p[0] // self.cell), int(p[1] // self.cell)
+
+    def move(self, i, p):
+        key = self.cell_of(p)
+        if key != self.keys[i]:
+            self.cells[self.keys[i]].discard(i)
+            if not self.cells[self.keys[i]]:
+                del self.cells[self.keys[i]]
+            self.cells.setdefault(key, set()).add(i)
+            self.keys[i] = key
+
+    def nearest(self, points, x, y, radius): # Ponto mais próximo de (x, y) a menos de radius, ou None
+        cx, cy = self.cell_of((x, y))
+        reach = int(np.ceil(radius / self.cell))
+        best, best_dist = None, radius * radius
+        for gx in range(cx - reach, cx + reach + 1):
+            for gy in range(cy - reach, cy + reach + 1):
+                for i in self.cells.get((gx, gy), ()):
+                    px, py = points[i]
+                    dist = (px - x) ** 2 + (py - y) ** 2
+                    if dist < best_dist:
+                        best, best_dist = i, dist
+        return best
+
+# Retorna o índice do ponto de controle sob o clique, ou None
+def pick_point(x, y):
+    if len(control_points) < grid_threshold: # Poucos pontos: uma única operação vetorizada é mais rápida
+        dist = np.hypot(control_points[:, 0] - x, control_points[:, 1] - y)
+        i = int(np.argmin(dist))
+        return i if dist[i] < pick_radius else None
+    return point_grid.nearest(control_points, x, y, pick_radius)
+
+point_grid = PointGrid(control_points)
+
+# Troca todos os pontos de controle (e os pesos) e refaz o que depende deles: nós, grade de seleção e curva
+# Quem substitui control_points deve passar por aqui; a grade só acompanha sozinha os pontos movidos no arraste
+def set_control_points(points, point_weights=None):
+    global control_points, weights, nodes, point_grid, selected_point, last_point
+    control_points = np.array(points, dtype=np.float32)
+    weights = np.ones(len(control_points)) if point_weights is None else np.array(point_weights, dtype=np.float64)
+    nodes = make_nodes()
+    point_grid = PointGrid(control_points)
+    selected_point = last_point = None
+    curve.invalidate()
 
 # Função de desenho das curvas B-Spline
 def draw_curve():
@@ -58,32 +284,42 @@ def draw_curve():
     glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
     # Desenhar pontos de controle
-    glBegin(GL_POINTS)
-    for point in control_points:
-        x, y = point
-        glVertex2f(x, y)
-    glEnd()
-
-    glColor4f(1.0, 0.0, 0.0, 0.2)
-    glPointSize(7)
+    draw_array(GL_POINTS, control_points)
 
     # Desenhar curvas B-Spline
-    glBegin(GL_POINTS)
-    for point in sample_curve(control_points):
-        x, y = point
-        glVertex2f(x, y)
-    glEnd()
+    # A polilinha adaptativa não tem buracos, então pode ser desenhada como linha (exceto no grau 0, que é descontínuo)
+    if curve is adaptive_curve and d > 0:
+        glColor4f(1.0, 0.0, 0.0, 0.6)
+        glLineWidth(3)
+        mode = GL_LINE_STRIP
+    else:
+        glColor4f(1.0, 0.0, 0.0, 0.2)
+        glPointSize(7)
+        mode = GL_POINTS
+    points = curve.update(control_points, weights)
+    curve_vbo.draw(mode, points, (curve, curve.version))
 
     glColor3f(0.0, 0.0, 0.0)
 
     # Desenhar legendas dos pontos de controle
-    for i, point in enumerate(control_points):
-        x, y = point
-        glRasterPos2f(x + 8, y - 8)
-        glutBitmapCharacter(GLUT_BITMAP_HELVETICA_18, ord(str(i)))
+    labels.draw(label_anchors(control_points))
 
     glFlush()
 
+# Desenha a mesma cena do draw_curve sem janela, com o rasterizador em software
+def render_offscreen(path=None):
+    canvas = Canvas(width, height, (1.0, 1.0, 1.0, 1.0))
+    canvas.points(control_points, 12, (0.0, 0.0, 0.0))
+    points = curve.update(control_points, weights)
+    if curve is adaptive_curve and d > 0:
+        canvas.line_strip(points, 3, (1.0, 0.0, 0.0, 0.6))
+    else:
+        canvas.points(points, 7, (1.0, 0.0, 0.0, 0.2))
+    canvas.text([(x, y, str(i)) for i, (x, y) in enumerate(label_anchors(control_points))], (0.0, 0.0, 0.0))
+    if path is not None:
+        canvas.save(path)
+    return canvas
+
 # Função para redimensionar a janela
 def reshape(w, h):
     global width, height
@@ -96,28 +332,33 @@ def reshape(w, h):
 
 # Função para lidar com eventos do teclado
 def keyboard(key, x, y):
-    global d
+    global d, curve, clamped, nodes
 
     if key == b'd':
         d = max(d - degree_step, degree_range[0])
     elif key == b'D':
         d = min(d + degree_step, degree_range[1])
+    elif key == b'a': # Alterna entre tesselação adaptativa e amostragem com passo fixo
+        curve = fixed_curve if curve is adaptive_curve else adaptive_curve
+        curve.invalidate() # Os pontos podem ter mudado enquanto o outro modo estava ativo
+    elif key == b'k': # Alterna entre nós uniformes e nós fixados nas pontas
+        clamped = not clamped
+    elif key in (b'+', b'-') and last_point is not None: # Aumenta ou diminui o peso do último ponto clicado
+        weights[last_point] *= weight_step if key == b'+' else 1 / weight_step
+        curve.move_point(control_points, weights, last_point)
+    nodes = make_nodes()
 
     glutPostRedisplay()
 
 # Função para lidar com eventos do mouse
 def mouse(button, state, x, y):
-    global selected_point
+    global selected_point, last_point
     if button == GLUT_LEFT_BUTTON:
         if state == GLUT_DOWN:
-            selected_point = None
             y = height - y
-            # Verify if click happened over a point
-            for i, [px, py] in enumerate(control_points):
-                d = np.sqrt((px - x) ** 2 + (py - y) ** 2)
-                if d < 12:
-                    selected_point = i
-                    break
+            selected_point = pick_point(x, y) # Verifica se o clique aconteceu sobre um ponto
+            if selected_point is not None:
+                last_point = selected_point
         elif state == GLUT_UP:
             selected_point = None
 
@@ -127,11 +368,19 @@ def mouse_motion(x, y):
     if selected_point is not None:
         y = height - y
         control_points[selected_point] = np.array([x, y], dtype=np.float32)
+        point_grid.move(selected_point, control_points[selected_point])
+        curve.move_point(control_points, weights, selected_point)
     glutPostRedisplay()
 
+# Medição opcional dos callbacks e das chamadas OpenGL (ligada com PERF_TRACE=arquivo.json)
+instrument.install(globals(), ["draw_curve", "pick_point", "mouse", "mouse_motion", "keyboard",
+                               "CurveBuffer.update", "CurveBuffer.move_point", "AdaptiveCurve.update",
+                               "AdaptiveCurve.move_point"], frame="draw_curve")
+
 # Função principal
 def main():
     glutInit()
+    glutSetOption(GLUT_ACTION_ON_WINDOW_CLOSE, GLUT_ACTION_GLUTMAINLOOP_RETURNS) # Fechar a janela volta do glutMainLoop, e o instrument grava o trace ao sair
     glutInitDisplayMode(GLUT_SINGLE | GLUT_RGBA)
     glutInitWindowSize(width, height)
     glutCreateWindow(b"Demo B-Splines")
@@ -0,0 +1,252 @@
+# Avaliação de curvas B-Spline sem dependência de OpenGL
+# Suporta vetores de nós arbitrários (uniformes, fixados nas pontas ou não uniformes) e pesos racionais (NURBS)
+# Pode ser importado sem efeitos colaterais e usado em servidores sem tela:
+#     python bspline.py curvas.npy saida/ --degree 3 --tolerance 0.5 --knots clamped
+import os
+import argparse
+import numpy as np
+from collections import OrderedDict
+
+# Avalia de uma vez, em todos os parâmetros u, as d + 1 funções de base de grau d não nulas em cada um
+# Retorna (B, span): B é (amostras x (d + 1)) e span o intervalo [t_j, t_j+1) de cada amostra, de modo que a
+# linha i de B contém os pesos dos pontos de controle span[i] - d até span[i] em u[i] (as demais funções são
+# nulas ali). Guardar só essa faixa custa O(amostras x d) em vez de O(amostras x n) da matriz completa
+def basis_band(u, d, nodes, n):
+    u = np.asarray(u, dtype=np.float64)
+    t = np.asarray(nodes, dtype=np.float64)
+    # Intervalo de cada parâmetro; u = t_n (e além) usa o último intervalo não vazio, que fecha a curva em t_n
+    last = np.searchsorted(t, t[n]) - 1
+    span = np.clip(np.searchsorted(t, u, side='right') - 1, d, last)
+
+    # Recorrência de Cox-de Boor restrita às funções não nulas, para todas as amostras ao mesmo tempo
+    B = np.zeros((len(u), d + 1))
+    B[:, 0] = 1
+    left = np.empty((len(u), d + 1))
+    right = np.empty((len(u), d + 1))
+    for p in range(1, d + 1):
+        left[:, p] = u - t[span + 1 - p]
+        right[:, p] = t[span + p] - u
+        saved = np.zeros(len(u))
+        for r in range(p):
+            temp = B[:, r] / (right[:, r + 1] + left[:, p - r])
+            B[:, r] = saved + right[:, r + 1] * temp
+            saved = left[:, p - r] * temp
+        B[:, p] = saved
+    return B, span
+
+# Combina os pontos de controle pts (n x dimensão) com a faixa de base: o ponto de cada amostra i é a soma de
+# B[i, r] * pts[span[i] - d + r]
+def apply_band(B, span, pts):
+    d = B.shape[1] - 1
+    windows = np.lib.stride_tricks.sliding_window_view(np.asarray(pts, dtype=np.float64), d + 1, axis=0)
+    return np.einsum('sr,skr->sk', B, windows[span - d]) # windows[j - d] são os pontos j - d até j, sem cópia
+
+# Parâmetros amostrados com passo fixo no domínio [t_d, t_n] da curva; t_n entra no fim para a polilinha
+# terminar no ponto final da curva (o último ponto de controle, com nós fixados nas pontas)
+def sample_parameters(d, nodes, n, step):
+    return np.append(np.arange(nodes[d], nodes[n], step), nodes[n])
+
+# Cache LRU das faixas de base já amostradas, limitado pelo total de bytes guardados (e não pela quantidade
+# de entradas, já que o tamanho de cada uma cresce com a quantidade de amostras)
+# A chave é (vetor de nós, grau, quantidade de pontos, passo), então mudar os nós invalida as entradas antigas
+# Os pesos racionais são aplicados depois, então a mesma base serve para qualquer conjunto de pesos
+class BasisCache(object):
+    def __init__(self, maxbytes=64 << 20):
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, nodes, d, n, step): # Retorna a tupla (B, span) de basis_band
+        key = (np.asarray(nodes, dtype=np.float64).tobytes(), d, n, step)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key) # Marca como usada mais recentemente
+            return self.entries[key]
+
+        self.misses += 1
+        band = basis_band(sample_parameters(d, nodes, n, step), d, nodes, n)
+        for a in band:
+            a.flags.writeable = False # A base é compartilhada entre chamadas
+        self.entries[key] = band
+        self.nbytes += sum(a.nbytes for a in band)
+        while self.nbytes > self.maxbytes and len(self.entries) > 1: # A entrada recém-criada sempre fica
+            old = self.entries.popitem(last=False)[1] # Descarta a menos usada recentemente
+            self.nbytes -= sum(a.nbytes for a in old)
+        return band
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+basis_cache = BasisCache()
+
+# Coordenadas homogêneas (w*x, w*y, w) dos pontos de controle de uma NURBS
+def homogeneous(pts, weights):
+    w = np.asarray(weights, dtype=np.float64)[:, None]
+    return np.hstack([np.asarray(pts, dtype=np.float64) * w, w])
+
+# Volta das coordenadas homogêneas para o plano
+def project(p):
+    return p[..., :-1] / p[..., -1:]
+
+# Algoritmo de de Boor: avalia um único ponto da curva em O(d²)
+# j é o intervalo [t_j, t_j+1) usado; se omitido, é o intervalo que contém u
+def de_boor(u, pts, d, nodes, j=None):
+    n = len(pts)
+    if j is None:
+        j = min(max(np.searchsorted(nodes, u, side='right') - 1, d), n - 1)
+    P = [np.asarray(pts[j - d + r], dtype=np.float64) for r in range(d + 1)]
+    for r in range(1, d + 1):
+        for s in range(d, r - 1, -1):
+            i = j - d + s
+            den = nodes[i + d - r + 1] - nodes[i]
+            a = (u - nodes[i]) / den if den != 0 else 0.0
+            P[s] = (1 - a) * P[s - 1] + a * P[s]
+    return P[d]
+
+# Distância do ponto pm até a corda p0-p1
+def chord_distance(p0, pm, p1):
+    chord = p1 - p0
+    length = np.hypot(*chord)
+    if length == 0:
+        return np.hypot(*(pm - p0))
+    return abs(chord[0] * (pm[1] - p0[1]) - chord[1] * (pm[0] - p0[0])) / length
+
+# Tesselação adaptativa do intervalo j: divide ao meio até que o ponto médio fique a menos de tol da corda
+# Retorna os pontos do intervalo sem o ponto final, que é o primeiro do intervalo seguinte
+# Com rational=True, pts está em coordenadas homogêneas e a tolerância é medida depois da projeção
+def tessellate_span(pts, j, d, nodes, tol=0.5, min_depth=2, max_depth=10, rational=False):
+    if nodes[j] == nodes[j + 1]: # Intervalo vazio (nó repetido)
+        return np.zeros((0, 2), dtype=np.float32)
+
+    def evaluate(u):
+        p = de_boor(u, pts, d, nodes, j)
+        return project(p) if rational else p
+
+    if d == 0:
+        return np.array([evaluate(nodes[j])], dtype=np.float32)
+
+    def subdivide(u0, p0, u1, p1, depth):
+        um = (u0 + u1) / 2
+        pm = evaluate(um)
+        if depth >= max_depth or (depth >= min_depth and chord_distance(p0, pm, p1) <= tol):
+            return [p0]
+        return subdivide(u0, p0, um, pm, depth + 1) + subdivide(um, pm, u1, p1, depth + 1)
+
+    u0, u1 = nodes[j], nodes[j + 1]
+    return np.array(subdivide(u0, evaluate(u0), u1, evaluate(u1), 0), dtype=np.float32)
+# Ponto final da curva (fim do último intervalo), que a tesselação por intervalos não inclui
+def curve_end(pts, d, nodes):
+    last = len(pts) - 1
+    if d == 0:
+        return np.asarray(pts[last], dtype=np.float64)
+    return de_boor(nodes[last + 1], pts, d, nodes, last)
+
+# Vetor de nós uniforme [0, 1, ..., n + d] usado pela demo
+def uniform_knots(n, d):
+    return np.arange(n + d + 1, dtype=np.float64)
+
+# Vetor de nós uniforme com d + 1 nós repetidos em cada ponta, para a curva começar e terminar nos pontos extremos
+def clamped_knots(n, d):
+    return np.concatenate([np.zeros(d), np.arange(n - d + 1), np.full(d, n - d)]).astype(np.float64)
+
+# Amostra a curva definida pelos pontos de controle pts, de grau d e nós nodes (uniformes se omitidos)
+# Com weights, a curva é uma NURBS; nodes pode ser qualquer vetor não decrescente com pelo menos n + d + 1 nós
+# Com tol, a polilinha é adaptativa (erro máximo tol); sem tol, os parâmetros são amostrados com passo fixo
+# Retorna um array (amostras x 2) float32
+def sample(pts, d, nodes=None, tol=None, step=0.01, weights=None):
+    pts = np.asarray(pts, dtype=np.float64)
+    n = len(pts)
+    if n <= d:
+        raise ValueError("uma curva de grau %d precisa de pelo menos %d pontos de controle" % (d, d + 1))
+    if nodes is None:
+        nodes = uniform_knots(n, d)
+    nodes = np.asarray(nodes, dtype=np.float64)
+    if len(nodes) < n + d + 1:
+        raise ValueError("são necessários %d nós para %d pontos de grau %d" % (n + d + 1, n, d))
+    if np.any(np.diff(nodes) < 0):
+        raise ValueError("o vetor de nós precisa ser não decrescente")
+
+    rational = weights is not None
+    if rational:
+        pts = homogeneous(pts, weights)
+
+    if tol is None:
+        points = apply_band(*basis_cache.get(nodes, d, n, step), pts)
+        return (project(points) if rational else points).astype(np.float32)
+    spans = [tessellate_span(pts, j, d, nodes, tol, rational=rational) for j in range(d, n)]
+    end = curve_end(pts, d, nodes)
+    return np.concatenate(spans + [(project(end) if rational else end)[None].astype(np.float32)])
+
+# Lê as curvas uma a uma, sem carregar o arquivo inteiro, como pares (pontos, pesos)
+# .npy: array (curvas x pontos x 2), ou (curvas x pontos x 3) com o peso na terceira coluna, aberto com memmap
+# .csv: uma curva por linha, no formato x0,y0,x1,y1,... (ou x0,y0,w0,x1,y1,w1,... com weighted=True)
+def read_curves(path, weighted=False):
+    if path.endswith(".npy"):
+        curves = np.load(path, mmap_mode="r")
+        for c in curves:
+            c = np.asarray(c, dtype=np.float64)
+            yield (c[:, :2], c[:, 2]) if c.shape[1] == 3 else (c, None)
+    else:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    c = np.array(line.split(","), dtype=np.float64).reshape(-1, 3 if weighted else 2)
+                    yield (c[:, :2], c[:, 2]) if weighted else (c, None)
+
+# Interpreta a opção --knots: "uniform", "clamped" ou uma lista de nós separados por vírgula
+def parse_knots(spec, n, d):
+    if spec == "uniform":
+        return uniform_knots(n, d)
+    if spec == "clamped":
+        return clamped_knots(n, d)
+    return np.array(spec.split(","), dtype=np.float64)
+
+# Salva um lote de curvas amostradas em um .npz: "points" contém todas as amostras concatenadas
+# e as amostras da curva i são points[offsets[i]:offsets[i + 1]]
+def write_chunk(path, samples):
+    offsets = np.zeros(len(samples) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(s) for s in samples])
+    np.savez(path, points=np.concatenate(samples), offsets=offsets)
+
+# Amostra as curvas (pares (pontos, pesos) como os de read_curves) e grava em out_dir a cada chunk curvas,
+# sem manter o conjunto inteiro na memória. knots é o formato aceito por parse_knots
+# Retorna a lista de arquivos escritos
+def export_curves(curves, out_dir, d, knots="uniform", tol=None, step=0.01, chunk=1000):
+    os.makedirs(out_dir, exist_ok=True)
+    files = []
+    samples = []
+    for pts, weights in curves:
+        samples.append(sample(pts, d, parse_knots(knots, len(pts), d), tol, step, weights))
+        if len(samples) == chunk:
+            files.append(os.path.join(out_dir, "curves_%05d.npz" % len(files)))
+            write_chunk(files[-1], samples)
+            samples = []
+    if samples:
+        files.append(os.path.join(out_dir, "curves_%05d.npz" % len(files)))
+        write_chunk(files[-1], samples)
+    return files
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Amostra curvas B-Spline de um arquivo .npy ou .csv sem abrir janela")
+    parser.add_argument("input", help="arquivo .npy (curvas x pontos x 2) ou .csv (x0,y0,x1,y1,... por linha)")
+    parser.add_argument("output", help="diretório onde os lotes .npz são gravados")
+    parser.add_argument("--degree", type=int, default=3)
+    parser.add_argument("--knots", default="uniform", help="uniform, clamped ou uma lista de nós separados por vírgula")
+    parser.add_argument("--weighted", action="store_true", help="o .csv traz um peso depois de cada ponto (x,y,w)")
+    parser.add_argument("--tolerance", type=float, default=None, help="erro máximo da tesselação adaptativa, em unidades das coordenadas")
+    parser.add_argument("--step", type=float, default=0.01, help="passo no parâmetro quando não há tolerância")
+    parser.add_argument("--chunk", type=int, default=1000, help="quantidade de curvas por arquivo de saída")
+    args = parser.parse_args(argv)
+
+    curves = read_curves(args.input, args.weighted)
+    files = export_curves(curves, args.output, args.degree, args.knots, args.tolerance, args.step, args.chunk)
+    print("%d arquivo(s) escrito(s) em %s" % (len(files), args.output))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from lineraster import line_samples, line_spans
+
+# Rasterizador em software para desenhar a demo sem janela (miniaturas, testes em máquinas sem tela)
+# A imagem é guardada nas coordenadas da janela do OpenGL (linha 0 embaixo, como no gluOrtho2D(0, w, 0, h))
+# e invertida só na hora de gravar. Cada chamada equivale a um glDrawArrays com a mistura
+# GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA: um pixel atingido k vezes pela mesma cor com alfa a fica com
+# destino * (1 - a)^k + cor * (1 - (1 - a)^k), exatamente como k misturas seguidas
+
+def to_rgba(color): # Cor do OpenGL com alfa (1 quando não informado)
+    return np.array(tuple(color) + (1.0,) * (4 - len(color)), dtype=np.float64)
+
+class Canvas(object):
+    def __init__(self, width, height, background=(1.0, 1.0, 1.0, 1.0)):
+        self.width, self.height = width, height
+        self.color = np.empty((height, width, 4))
+        self.color[:] = to_rgba(background)
+
+    def blend(self, rows, cols, color): # Mistura a cor em cada pixel, uma vez por fragmento
+        ok = (rows >= 0) & (rows < self.height) & (cols >= 0) & (cols < self.width)
+        hits = np.bincount(rows[ok] * self.width + cols[ok], minlength=self.width * self.height)
+        hits = hits.reshape(self.height, self.width)
+        rgba = to_rgba(color)
+        keep = (1 - rgba[3]) ** hits # Fração do destino que sobra depois das misturas
+        self.color[..., :3] = self.color[..., :3] * keep[..., None] + rgba[:3] * (1 - keep[..., None])
+
+    def points(self, points, size, color): # Pontos suavizados (GL_POINT_SMOOTH): discos de diâmetro size
+        p = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        reach = int(np.ceil(size / 2))
+        dy, dx = np.mgrid[-reach:reach + 1, -reach:reach + 1].reshape(2, -1)
+        cols = np.floor(p[:, 0])[:, None].astype(np.int64) + dx
+        rows = np.floor(p[:, 1])[:, None].astype(np.int64) + dy
+        # Pixels cujos centros ficam dentro do disco
+        inside = (cols + 0.5 - p[:, :1]) ** 2 + (rows + 0.5 - p[:, 1:]) ** 2 <= (size / 2) ** 2
+        self.blend(rows[inside], cols[inside], color)
+
+    def line_strip(self, points, width, color): # GL_LINE_STRIP sem suavização, com width pixels de largura
+        p = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        a, b = p[:-1], p[1:]
+        major, first, counts = line_spans(a, b)
+        seg, m, t = line_samples(a, b, major, first, counts)
+        axis = major[seg]
+        minor = np.floor(a[seg, 1 - axis] + t * (b[seg, 1 - axis] - a[seg, 1 - axis])).astype(np.int64)
+        # Linhas largas repetem o pixel ao longo do eixo secundário
+        offsets = np.arange(width) - (width - 1) // 2
+        minor = (minor[:, None] + offsets).ravel()
+        m = np.repeat(m, width)
+        x_major = np.repeat(axis == 0, width)
+        self.blend(np.where(x_major, minor, m), np.where(x_major, m, minor), color)
+
+    def text(self, labels, color): # Textos (x, y, texto) com a linha de base em (x, y), como glRasterPos + glutBitmapCharacter
+        image = self.image()
+        draw = ImageDraw.Draw(image)
+        font = ImageFont.load_default()
+        fill = tuple(np.round(to_rgba(color) * 255).astype(int))
+        for x, y, string in labels:
+            draw.text((x, self.height - y), string, font=font, anchor="ls", fill=fill)
+        self.color = np.flipud(np.asarray(image, dtype=np.float64) / 255)
+
+    def image(self): # Imagem RGBA com a primeira linha em cima
+        rgba = np.round(np.clip(np.flipud(self.color), 0, 1) * 255).astype(np.uint8)
+        return Image.fromarray(rgba, 'RGBA')
+
+    def save(self, path):
+        self.image().save(path)
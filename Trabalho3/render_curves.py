@@ -0,0 +1,48 @@
+import os
+import argparse
+from multiprocessing import Pool
+import numpy as np
+import b_splines
+from bspline import read_curves
+
+# Desenha curvas da demo em arquivos PNG, sem abrir janela, uma imagem por curva e por grau
+# As imagens são desenhadas em processos separados, então um lote usa todos os núcleos disponíveis
+
+def render(job): # Ajusta o estado da demo para a curva pedida e grava a imagem; roda dentro de um processo do Pool
+    pts, weights, d, clamped, adaptive, size, output = job
+    b_splines.width, b_splines.height = size
+    b_splines.d = d
+    b_splines.clamped = clamped
+    b_splines.curve = b_splines.adaptive_curve if adaptive else b_splines.fixed_curve
+    b_splines.set_control_points(pts, weights)
+    b_splines.render_offscreen(output)
+    return output
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Desenha curvas B-Spline da demo em imagens PNG sem abrir janela")
+    parser.add_argument("input", nargs="?", help="arquivo .npy ou .csv com as curvas (padrão: os pontos da demo)")
+    parser.add_argument("--output", default=".", help="diretório onde as imagens são gravadas")
+    parser.add_argument("--degrees", default="1", help="graus separados por vírgula; uma imagem por grau")
+    parser.add_argument("--clamped", action="store_true", help="nós repetidos nas pontas")
+    parser.add_argument("--adaptive", action="store_true", help="tesselação adaptativa em vez da amostragem com passo fixo")
+    parser.add_argument("--weighted", action="store_true", help="o .csv traz um peso depois de cada ponto (x,y,w)")
+    parser.add_argument("--size", default="%dx%d" % (b_splines.width, b_splines.height), help="largura x altura da imagem")
+    parser.add_argument("--jobs", type=int, default=None, help="quantidade de processos (padrão: um por núcleo)")
+    args = parser.parse_args(argv)
+
+    size = tuple(int(v) for v in args.size.split("x"))
+    degrees = [int(v) for v in args.degrees.split(",")]
+    if args.input:
+        curves = read_curves(args.input, args.weighted)
+    else:
+        curves = [(b_splines.control_points, b_splines.weights)]
+    os.makedirs(args.output, exist_ok=True)
+    jobs = ((np.array(pts), np.ones(len(pts)) if w is None else np.array(w), d, args.clamped, args.adaptive, size,
+             os.path.join(args.output, "curve%05d_d%d.png" % (i, d)))
+            for i, (pts, w) in enumerate(curves) for d in degrees)
+    with Pool(args.jobs) as pool:
+        for output in pool.imap_unordered(render, jobs):
+            print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import math
+import random
+import argparse
+import itertools
+import platform
+import importlib
+from time import perf_counter
+import numpy as np
+
+# Benchmarks dos pontos críticos dos três trabalhos, sem abrir janela
+# Cada caso roda com sementes fixas sobre uma varredura de parâmetros e grava os tempos em JSON. Com --compare,
+# os tempos são comparados com um arquivo gravado antes (por exemplo, na versão anterior) e regressões acima
+# do limite fazem o programa terminar com código 1
+#
+#   python benchmarks/run.py --output atual.json
+#   python benchmarks/run.py --compare base.json
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+seed = 2023
+
+# Os módulos dos três trabalhos têm nomes distintos, então basta pôr o diretório do programa no caminho
+def load(folder, module):
+    path = os.path.join(root, folder)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return importlib.import_module(module)
+
+def measure(function, repeat, number): # Melhor e mediana do tempo por chamada, em segundos
+    times = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        for _ in range(number):
+            function()
+        times.append((perf_counter() - t0) / number)
+    return min(times), float(np.median(times))
+
+def calibrate(function, target=0.05): # Quantidade de chamadas por repetição para cada uma levar cerca de target segundos
+    t0 = perf_counter()
+    function()
+    elapsed = perf_counter() - t0
+    return max(1, int(target / max(elapsed, 1e-7)))
+
+results = []
+
+def bench(name, params, function, repeat):
+    number = calibrate(function)
+    best, median = measure(function, repeat, number)
+    results.append({"name": name, "params": params, "min": best, "median": median, "number": number, "repeat": repeat})
+    print("%-32s %-36s %12.3f us" % (name, json.dumps(params, sort_keys=True), median * 1e6))
+
+# Trabalho1: teste de ponto forma a forma (Rect.contains / Circle.contains) e seleção pelo índice
+def bench_shapes(sizes, repeat):
+    se = load("Trabalho1", "ShapeEditor")
+    rng = np.random.default_rng(seed)
+    for n in sizes:
+        se.store, se.index = se.ShapeStore(), se.BVH() # Cena vazia
+        for i in range(n):
+            x, y = rng.uniform(0, 800, 2)
+            if i % 2:
+                s = se.Rect([[x, y], [x + rng.uniform(5, 60), y + rng.uniform(5, 60)]])
+            else:
+                s = se.Circle([x, y], rng.uniform(3, 30))
+            angle, scale = rng.uniform(0, 2 * math.pi), rng.uniform(0.5, 2)
+            c, s_ = math.cos(angle) * scale, math.sin(angle) * scale
+            s.set_transform(np.array([[c, s_], [-s_, c], [x - x * c + y * s_, y - x * s_ - y * c]]))
+            se.add_shape(s)
+        points = rng.uniform(0, 800, (64, 2))
+        shapes = [se.shapes[i] for i in range(n)]
+
+        def contains_all():
+            for p in points:
+                for s in shapes:
+                    s.contains(p)
+        bench("shape.contains", {"shapes": n, "points": len(points)}, contains_all, repeat)
+
+        def pick_all():
+            for x, y in points:
+                se.pick(x, y)
+        bench("shape.pick", {"shapes": n, "points": len(points)}, pick_all, repeat)
+
+# Trabalho3: o trabalho de cada quadro ao arrastar um ponto de controle (move_point, com a base em cache no passo
+# fixo) e a reamostragem completa sem cache, que acontece ao mudar o grau ou os nós
+def bench_curves(degrees, counts, repeat):
+    bs = load("Trabalho3", "b_splines")
+    rng = np.random.default_rng(seed)
+    for count in counts:
+        bs.set_control_points(rng.uniform(100, 700, (count, 2)))
+        i = count // 2 # Ponto arrastado, no meio da curva
+        y = float(bs.control_points[i, 1])
+        for d in degrees:
+            if d >= count:
+                continue
+            bs.d = d
+            bs.nodes = bs.make_nodes()
+            for name, curve in (("CurveBuffer.move_point", bs.fixed_curve), ("AdaptiveCurve.move_point", bs.adaptive_curve)):
+                curve.invalidate()
+                curve.update(bs.control_points, bs.weights)
+                offsets = itertools.cycle([5.0, -5.0]) # O ponto vai e volta, sem sair do lugar
+
+                def drag():
+                    bs.control_points[i, 1] = y + next(offsets)
+                    curve.move_point(bs.control_points, bs.weights, i)
+                bench(name, {"degree": d, "points": count}, drag, repeat)
+            bs.control_points[i, 1] = y
+
+            def cold():
+                bs.basis_cache.clear()
+                bs.fixed_curve.invalidate()
+                bs.fixed_curve.update(bs.control_points, bs.weights)
+            bench("CurveBuffer.update", {"degree": d, "points": count, "cache": False}, cold, repeat)
+
+# Trabalho2: validação das direções, teste de remoção, solução completa, quadro das animações, vértices
+# dos cubos e rotação do arcball
+def bench_cubes(sizes, repeat):
+    tap = load("Trabalho2", "tapaway3d")
+    for n in sizes:
+        tap.n = n
+        np.random.seed(seed)
+        directions = tap.generate_random_directions()
+
+        def validate():
+            random.seed(seed)
+            tap.validate_directions(directions)
+        bench("validate_directions", {"n": n}, validate, repeat)
+
+        random.seed(seed)
+        tap.new_game(tap.validate_directions(directions))
+
+        def verify_all():
+            for cube in range(n ** 3):
+                tap.verify_removal_possibility(cube)
+        bench("verify_removal_possibility", {"n": n, "cubes": n ** 3}, verify_all, repeat)
+
+        def solve(): # Ordem de remoção completa pela fronteira de cubos livres
+            list(tap.Frontier(tap.directions.tolist(), n).solve())
+        bench("Frontier.solve", {"n": n, "cubes": n ** 3}, solve, repeat)
+
+        def animate(): # Um quadro das animações, com metade dos cubos sendo removidos
+            tap.update_removal_animation()
+            tap.update_click_animation()
+        distance, tap.removal_distance = tap.removal_distance, float("inf") # Animações não terminam durante a medida
+        for cube in range(0, n ** 3, 2):
+            tap.board.start_removal(cube)
+        bench("animation_frame", {"n": n, "cubes": n ** 3}, animate, repeat)
+        tap.removal_distance = distance
+
+        cubes = tap.CubeRenderer(n, tap.cube_faces, tap.tex_coord) # Vértices de todos os cubos em um único buffer
+        bench("CubeRenderer.vertices", {"n": n, "cubes": n ** 3}, lambda: cubes.vertices(tap.board), repeat)
+
+    arcball = load("Trabalho2", "arcball")
+    ball = arcball.ArcBall((400, 400, 0), 400)
+    rng = np.random.default_rng(seed)
+    pairs = rng.uniform(0, 800, (256, 4)).tolist()
+
+    def rotations():
+        for x0, y0, x1, y1 in pairs:
+            ball.rot(x0, y0, x1, y1)
+    bench("ArcBall.rot", {"pairs": len(pairs)}, rotations, repeat)
+
+def compare(current, baseline, threshold): # Mostra a razão atual / base de cada caso e retorna as regressões
+    key = lambda r: (r["name"], json.dumps(r["params"], sort_keys=True))
+    base = {key(r): r for r in baseline["results"]}
+    regressions = []
+    print("\n%-32s %-36s %12s %12s %8s" % ("caso", "parâmetros", "base (us)", "atual (us)", "razão"))
+    for r in current:
+        b = base.get(key(r))
+        if b is None:
+            continue
+        ratio = r["median"] / b["median"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  regressão"
+            regressions.append(r)
+        elif ratio < 1 / (1 + threshold):
+            flag = "  melhora"
+        print("%-32s %-36s %12.3f %12.3f %8.2f%s" % (key(r)[0], key(r)[1], b["median"] * 1e6, r["median"] * 1e6, ratio, flag))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks dos três trabalhos, sem janela")
+    parser.add_argument("--output", default="benchmark.json", help="arquivo JSON com os resultados")
+    parser.add_argument("--compare", default=None, help="resultados gravados antes, para comparação")
+    parser.add_argument("--threshold", type=float, default=0.10, help="aumento relativo considerado regressão")
+    parser.add_argument("--quick", action="store_true", help="varreduras menores e menos repetições")
+    parser.add_argument("--only", default=None, help="roda só um grupo: shapes, curves ou cubes")
+    args = parser.parse_args(argv)
+
+    repeat = 3 if args.quick else 7
+    if args.only in (None, "shapes"):
+        bench_shapes([10, 100, 1000] if args.quick else [10, 100, 1000, 10000], repeat)
+    if args.only in (None, "curves"):
+        bench_curves([1, 3, 5], [6, 50] if args.quick else [6, 50, 500], repeat)
+    if args.only in (None, "cubes"):
+        bench_cubes([3, 5, 10] if args.quick else [3, 5, 10, 20, 30], repeat)
+
+    report = {"meta": {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+                       "platform": platform.platform(), "seed": seed, "quick": args.quick},
+              "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    print("\nresultados gravados em %s" % args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print("%d regressão(ões) acima de %d%%" % (len(regressions), args.threshold * 100))
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import sys
+import json
+import atexit
+from time import perf_counter_ns
+from collections import deque
+
+# Instrumentação opcional: mede o tempo das funções de desenho e de seleção e conta as chamadas OpenGL por quadro
+# Só é ligada com a variável de ambiente PERF_TRACE=<arquivo.json>; desligada, install não troca nenhuma função
+# e o programa roda exatamente como antes. Ao sair (atexit), grava no arquivo um trace no formato do Chrome
+# (abre em chrome://tracing ou no Perfetto) com os percentis de cada função junto, em "stats"
+# Módulo único para os três trabalhos: cada programa acrescenta este diretório (common/) ao sys.path
+# O freeglut encerra o processo com exit() do C quando a janela é fechada, sem passar pelo atexit; por isso os
+# programas pedem GLUT_ACTION_GLUTMAINLOOP_RETURNS e o glutMainLoop volta antes de o Python terminar
+
+output = os.environ.get("PERF_TRACE")
+enabled = bool(output)
+window = 1000 # Quantidade de medidas recentes usadas nos percentis
+max_events = 200000 # Eventos guardados para o trace (os mais antigos são descartados)
+
+samples = {} # Nome -> últimas durações em nanossegundos
+totals = {} # Nome -> (quantidade de chamadas, tempo total em nanossegundos)
+events = deque(maxlen=max_events)
+gl_calls = 0 # Chamadas OpenGL desde o fim do último quadro
+start = perf_counter_ns()
+
+def record(name, t0, t1):
+    if name not in samples:
+        samples[name] = deque(maxlen=window)
+        totals[name] = (0, 0)
+    samples[name].append(t1 - t0)
+    count, total = totals[name]
+    totals[name] = (count + 1, total + t1 - t0)
+    events.append((name, t0, t1))
+
+def timed(name, function, frame=False): # Versão de function que mede cada chamada
+    def wrapper(*args, **kwargs):
+        global gl_calls
+        t0 = perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            t1 = perf_counter_ns()
+            record(name, t0, t1)
+            if frame: # Fim de um quadro: guarda quantas chamadas OpenGL ele fez
+                samples.setdefault("gl_calls_per_frame", deque(maxlen=window)).append(gl_calls)
+                gl_calls = 0
+    wrapper.__name__ = getattr(function, "__name__", name)
+    return wrapper
+
+def counted(function): # Versão de uma função OpenGL que conta as chamadas
+    def wrapper(*args, **kwargs):
+        global gl_calls
+        gl_calls += 1
+        return function(*args, **kwargs)
+    return wrapper
+
+# Troca as funções de namespace listadas em names (ou "Classe.metodo") por versões medidas, e as funções gl* de
+# gl_namespaces (padrão: o próprio namespace) por versões que contam chamadas. frame é a função de desenho cujo
+# retorno marca o fim de um quadro. Sem PERF_TRACE não faz nada
+def install(namespace, names, frame=None, gl_namespaces=None):
+    if not enabled:
+        return
+    for name in names:
+        if "." in name: # Método de uma classe
+            cls, attr = name.split(".")
+            setattr(namespace[cls], attr, timed(name, getattr(namespace[cls], attr), name == frame))
+        else:
+            namespace[name] = timed(name, namespace[name], name == frame)
+    for ns in gl_namespaces or [namespace]:
+        for name, value in list(ns.items()):
+            if name.startswith("gl") and name[2:3].isupper() and callable(value):
+                ns[name] = counted(value)
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q / 100 * len(values)), len(values) - 1)] if values else 0
+
+def stats(): # Percentis (em milissegundos) das medidas recentes de cada função
+    result = {}
+    for name, values in samples.items():
+        scale = 1 if name == "gl_calls_per_frame" else 1e-6
+        entry = {"p%d" % q: percentile(values, q) * scale for q in (50, 95, 99)}
+        entry["max"] = max(values) * scale if values else 0
+        if name in totals:
+            entry["count"], entry["total"] = totals[name][0], totals[name][1] * scale
+        result[name] = entry
+    return result
+
+def dump(path=None): # Grava o trace e os percentis em JSON e mostra um resumo na saída de erro
+    path = path or output
+    trace = [{"name": name, "ph": "X", "pid": 0, "tid": 0, "ts": (t0 - start) / 1000, "dur": (t1 - t0) / 1000}
+             for name, t0, t1 in events]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms", "stats": stats()}, f)
+    for name, entry in sorted(stats().items()):
+        print("%-28s p50 %9.3f  p95 %9.3f  p99 %9.3f" % (name, entry["p50"], entry["p95"], entry["p99"]), file=sys.stderr)
+
+if enabled:
+    atexit.register(dump)
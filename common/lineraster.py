@@ -0,0 +1,26 @@
+import numpy as np
+
+# Rasterização de segmentos de reta comum aos rasterizadores em software dos trabalhos (sceneraster e curveraster)
+# Como no OpenGL sem suavização, cada segmento acende um pixel por coluna (ou linha) do seu eixo principal: uma
+# amostra em cada centro de pixel do eixo principal no intervalo [início, fim) do segmento. Cada programa calcula
+# a partir das amostras o pixel do eixo secundário (e o que mais precisar, como a profundidade)
+
+def line_spans(a, b, size=None): # Eixo principal (0: x, 1: y), primeira amostra e quantidade de amostras de cada segmento
+    # a, b: (k x 2) extremos dos segmentos; com size = (largura, altura), só as amostras dentro da imagem
+    d = b - a
+    major = (np.abs(d[:, 1]) > np.abs(d[:, 0])).astype(np.int64)
+    idx = np.arange(len(a))
+    first = np.ceil(np.minimum(a[idx, major], b[idx, major]) - 0.5)
+    end = np.ceil(np.maximum(a[idx, major], b[idx, major]) - 0.5)
+    if size is not None:
+        limit = np.where(major == 0, size[0], size[1])
+        first, end = np.clip(first, 0, limit), np.clip(end, 0, limit)
+    first = first.astype(np.int64)
+    return major, first, np.maximum(end.astype(np.int64) - first, 0)
+
+def line_samples(a, b, major, first, counts): # Amostras dos segmentos: segmento, pixel no eixo principal e parâmetro t
+    # t vai de 0 em a até 1 em b; o ponto da amostra é a + t (b - a)
+    seg = np.repeat(np.arange(len(a)), counts)
+    m = first[seg] + np.arange(len(seg)) - np.repeat(np.cumsum(counts) - counts, counts)
+    t = (m + 0.5 - a[seg, major[seg]]) / (b[seg, major[seg]] - a[seg, major[seg]])
+    return seg, m, t
@@ -0,0 +1,128 @@
+import os
+import sys
+import ctypes
+import argparse
+# O PyOpenGL escolhe a plataforma ao ser importado: com EGL e a plataforma surfaceless do Mesa, o --update
+# desenha com o OpenGL de verdade (llvmpipe, sem janela nem servidor gráfico)
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+import numpy as np
+from PIL import Image
+
+# Confere se os rasterizadores em software (sceneraster e curveraster) desenham o mesmo que o OpenGL
+# Cada caso monta uma cena fixa em um dos programas, desenha com o rasterizador em software e compara com
+# uma imagem de referência gravada a partir do OpenGL. Um pixel difere quando algum canal (R, G ou B) muda
+# mais que --tolerance; o caso passa se no máximo --fraction dos pixels diferem
+#
+#   python common/rastercheck.py            compara e termina com código 1 se algum caso falhar
+#   python common/rastercheck.py --update   grava de novo as referências, desenhadas com o OpenGL
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(root, "Trabalho1"), os.path.join(root, "Trabalho3")]
+import ShapeEditor
+import b_splines
+from OpenGL.GL import *
+
+width, height = 800, 600
+
+def gl_context(width, height): # Contexto OpenGL sem janela, desenhando em um pbuffer
+    from OpenGL import EGL
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    EGL.eglInitialize(display, None, None)
+    attributes = [EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT, EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+                  EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8, EGL.EGL_DEPTH_SIZE, 24, EGL.EGL_NONE]
+    config, count = EGL.EGLConfig(), EGL.EGLint()
+    EGL.eglChooseConfig(display, (EGL.EGLint * len(attributes))(*attributes), ctypes.pointer(config), 1, ctypes.pointer(count))
+    surface = EGL.eglCreatePbufferSurface(display, config, (EGL.EGLint * 5)(EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height, EGL.EGL_NONE))
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+    EGL.eglMakeCurrent(display, surface, surface, context)
+
+def read_pixels(width, height): # Imagem RGB com a primeira linha em cima
+    glFinish()
+    data = glReadPixels(0, 0, width, height, GL_RGB, GL_UNSIGNED_BYTE)
+    return np.flipud(np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3))
+
+# Cena do ShapeEditor: retângulos e círculos sobrepostos, com rotação e escala
+def scene_setup():
+    se = ShapeEditor
+    se.width, se.height = width, height
+    se.store, se.index = se.ShapeStore(), se.BVH()
+    se.renderer.invalidate()
+    rng = np.random.default_rng(17)
+    for i in range(40):
+        x, y = rng.uniform(50, 750), rng.uniform(50, 550)
+        if i % 2:
+            s = se.Rect([[x, y], [x + rng.uniform(10, 120), y + rng.uniform(10, 120)]])
+        else:
+            s = se.Circle([x, y], rng.uniform(5, 60))
+        angle, scale = rng.uniform(0, 2 * np.pi), rng.uniform(0.5, 1.5)
+        c, s_ = np.cos(angle) * scale, np.sin(angle) * scale
+        s.set_transform(np.array([[c, s_], [-s_, c], [x - x * c + y * s_, y - x * s_ - y * c]]))
+        se.add_shape(s)
+
+def scene_gl(): # Mesmas chamadas do display quando a cena inteira é redesenhada
+    ShapeEditor.reshape(width, height)
+    glEnable(GL_DEPTH_TEST)
+    glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+    ShapeEditor.renderer.upload(ShapeEditor.scene_vertices())
+    ShapeEditor.renderer.draw()
+
+def scene_software():
+    return np.asarray(ShapeEditor.render_offscreen().image())[..., :3]
+
+# Curva da demo de B-Splines, de grau 3, com amostragem de passo fixo ou tesselação adaptativa
+def curve_setup(adaptive):
+    def setup():
+        bs = b_splines
+        bs.width, bs.height = width, height
+        rng = np.random.default_rng(3)
+        points = rng.uniform(50, 750, (15, 2))
+        points[:, 1] *= height / width
+        bs.d = 3
+        bs.curve = bs.adaptive_curve if adaptive else bs.fixed_curve
+        bs.set_control_points(points)
+    return setup
+
+def curve_gl():
+    glDisable(GL_DEPTH_TEST) # Ligado pelo caso do ShapeEditor, no mesmo contexto; a demo não usa profundidade
+    b_splines.reshape(width, height)
+    b_splines.draw_curve()
+
+def curve_software():
+    return np.asarray(b_splines.render_offscreen().image())[..., :3]
+
+cases = [("Trabalho1/reference/scene.png", scene_setup, scene_gl, scene_software),
+         ("Trabalho3/reference/curve_fixed.png", curve_setup(False), curve_gl, curve_software),
+         ("Trabalho3/reference/curve_adaptive.png", curve_setup(True), curve_gl, curve_software)]
+
+def difference(image, reference, tolerance): # Fração dos pixels com algum canal diferindo mais que tolerance
+    return float(np.mean(np.abs(image.astype(np.int16) - reference.astype(np.int16)).max(axis=2) > tolerance))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara os rasterizadores em software com referências do OpenGL")
+    parser.add_argument("--update", action="store_true", help="grava as referências de novo, desenhadas com o OpenGL")
+    parser.add_argument("--tolerance", type=int, default=64, help="diferença máxima por canal (0 a 255)")
+    parser.add_argument("--fraction", type=float, default=0.001, help="fração máxima de pixels diferentes")
+    args = parser.parse_args(argv)
+
+    if args.update:
+        gl_context(width, height)
+    failed = 0
+    for name, setup, gl, software in cases:
+        path = os.path.join(root, name)
+        setup()
+        if args.update:
+            gl()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            Image.fromarray(read_pixels(width, height)).save(path)
+        reference = np.asarray(Image.open(path).convert("RGB"))
+        fraction = difference(software(), reference, args.tolerance)
+        ok = fraction <= args.fraction
+        failed += not ok
+        print("%-40s %8.4f%% dos pixels diferentes  %s" % (name, fraction * 100, "ok" if ok else "FALHOU"))
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()